@@ -0,0 +1,106 @@
+# boardfeatures.py
+
+# Atributos derivados do tabuleiro do Quatro em Linha, calculados com numpy para lotes inteiros de estados.
+# Cada estado é o tabuleiro achatado (42 células, linha 0 em cima): 0 = vazia, 1 = jogador 1, 2 = jogador 2.
+# Os atributos são relativos ao jogador que vai jogar ("próprio") e ao adversário, para que a mesma tática
+# tenha o mesmo valor seja qual for o jogador:
+# - altura de cada coluna
+# - colunas onde o jogador que vai jogar ganha já (vitória) e onde o adversário ganharia (bloqueio)
+# - nº de três em linha abertos (3 peças e 1 casa vazia numa linha de 4) de cada jogador
+# - controlo do centro (peças próprias menos peças do adversário na coluna do meio)
+
+import numpy as np
+
+ROWS, COLS = 6, 7
+EMPTY, PLAYER1, PLAYER2 = 0, 1, 2
+
+
+def _windows():
+    '''Índices (no tabuleiro achatado) das 69 linhas de 4 casas: horizontais, verticais e as duas diagonais'''
+    windows = []
+    for r in range(ROWS):
+        for c in range(COLS):
+            for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                cells = [(r + i * dr, c + i * dc) for i in range(4)]
+                if all(0 <= rr < ROWS and 0 <= cc < COLS for rr, cc in cells):
+                    windows.append([rr * COLS + cc for rr, cc in cells])
+    return np.array(windows)
+
+
+WINDOWS = _windows()
+# WINDOW_CELLS[k][w, cell] = 1 se a k-ésima casa da linha w é cell; serve para passar de linhas para casas com um produto de matrizes
+WINDOW_CELLS = np.zeros((4, len(WINDOWS), ROWS * COLS), dtype=np.float32)   # float: o produto usa BLAS
+for _k in range(4):
+    WINDOW_CELLS[_k, np.arange(len(WINDOWS)), WINDOWS[:, _k]] = 1
+
+FEATURE_NAMES = ([f'height_{c}' for c in range(COLS)] + [f'win_{c}' for c in range(COLS)] +
+                 [f'block_{c}' for c in range(COLS)] + ['open_threes_own', 'open_threes_opponent', 'centre_control'])
+
+
+def threat_cells(window_cells, player):
+    '''Casas vazias que completam quatro em linha para player: (n, 42), booleano'''
+    threats = ((window_cells == player).sum(axis=2) == 3) & ((window_cells == EMPTY).sum(axis=2) == 1)
+    empty = window_cells == EMPTY
+    cells = sum((threats & empty[:, :, k]).astype(np.float32) @ WINDOW_CELLS[k] for k in range(4))
+    return cells > 0, threats.sum(axis=1)
+
+
+def board_features(X):
+    '''Atributos derivados de um lote de tabuleiros achatados (n, 42). Devolve um array (n, len(FEATURE_NAMES)) de inteiros'''
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.shape[1] != ROWS * COLS:
+        raise ValueError(f"Esperados tabuleiros com {ROWS * COLS} células, recebidas {X.shape[1]}")
+    n = len(X)
+    board = X.reshape(n, ROWS, COLS)
+    filled = board != EMPTY
+    heights = filled.sum(axis=1)
+
+    # Casa jogável: vazia e com a casa de baixo ocupada (ou na última linha)
+    below = np.concatenate((filled[:, 1:], np.ones((n, 1, COLS), dtype=bool)), axis=1)
+    playable = (~filled & below).reshape(n, -1)
+
+    # O jogador 1 começa: joga o jogador 1 quando os dois têm o mesmo nº de peças
+    own = np.where((board == PLAYER1).sum(axis=(1, 2)) == (board == PLAYER2).sum(axis=(1, 2)), PLAYER1, PLAYER2)
+    opponent = PLAYER1 + PLAYER2 - own
+
+    window_cells = X[:, WINDOWS]
+    win_cells, own_threes = threat_cells(window_cells, own[:, None, None])
+    block_cells, opponent_threes = threat_cells(window_cells, opponent[:, None, None])
+    wins = (win_cells & playable).reshape(n, ROWS, COLS).any(axis=1)
+    blocks = (block_cells & playable).reshape(n, ROWS, COLS).any(axis=1)
+
+    centre = board[:, :, COLS // 2]
+    centre_control = (centre == own[:, None]).sum(axis=1) - (centre == opponent[:, None]).sum(axis=1)
+
+    return np.column_stack((heights, wins, blocks, own_threes, opponent_threes, centre_control)).astype(np.int64)
+
+
+def with_board_features(X):
+    '''As 42 células seguidas dos atributos derivados'''
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    return np.hstack((X, board_features(X)))
+
+
+def legal_move_mask(X, columns):
+    '''Para cada tabuleiro (linha de X) e coluna em columns, se a jogada é legal: a casa de cima da coluna está vazia.
+    Valores de columns que não são colunas do tabuleiro nunca são legais'''
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    columns = np.asarray(columns)
+    valid = np.isin(columns, np.arange(COLS))
+    top = X[:, np.where(valid, columns, 0).astype(int)]       # Linha 0 do tabuleiro achatado
+    return (top == EMPTY) & valid
+
+
+def column_preference(columns):
+    '''Pontuação de cada coluna para escolher entre jogadas sem mais informação: o centro primeiro e, à mesma
+    distância do centro, a coluna da esquerda. Valores que não são colunas do tabuleiro ficam com -inf'''
+    columns = np.asarray(columns)
+    valid = np.isin(columns, np.arange(COLS))
+    distance = np.abs(np.where(valid, columns, 0).astype(int) - COLS // 2)
+    return np.where(valid, -(2 * distance + (np.where(valid, columns, 0) > COLS // 2)), -np.inf)
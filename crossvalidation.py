@@ -0,0 +1,123 @@
+# crossvalidation.py
+
+# Validação cruzada (k-fold) da árvore de decisão, com os folds treinados e avaliados em processos paralelos.
+# O dataset é codificado uma vez (atributos no menor tipo inteiro possível, classes em 0..k-1) e partilhado
+# com os processos através de memória partilhada, sem cópias por fold.
+# Para cada fold são medidos: tempo de treino, tempo de previsão, accuracy, accuracy top-k e,
+# nos datasets do Quatro em Linha, a accuracy quando a previsão é restrita às jogadas legais.
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from decisiontree import DecisionTree, SharedArrays, attach_shared_arrays
+from boardfeatures import legal_move_mask, COLS
+
+
+def encode_dataset(X, y):
+    '''Atributos inteiros no menor tipo que os representa; classes codificadas em 0..k-1'''
+    X = np.asarray(X)
+    if np.issubdtype(X.dtype, np.integer) and X.size:
+        X = X.astype(np.min_scalar_type(-int(np.abs(X).max()) - 1))
+    classes, y_codes = np.unique(np.asarray(y), return_inverse=True)
+    return X, y_codes.astype(np.min_scalar_type(len(classes))), classes
+
+
+_shared = {}
+
+
+def _attach_arrays(spec, classes, legal):
+    '''Inicializador dos processos do pool: liga-se aos arrays em memória partilhada (ver decisiontree.SharedArrays)'''
+    _shared.update(attach_shared_arrays(spec))
+    _shared['classes'] = classes
+    _shared['legal'] = legal
+
+
+def _run_fold(fold, params, top_k):
+    '''Tarefa do pool: treina no resto dos dados e avalia no fold dado'''
+    X, y, folds, classes = _shared['X'], _shared['y'], _shared['folds'], _shared['classes']
+    test = folds == fold
+    X_test, y_test = X[test], y[test]
+
+    tree = DecisionTree(**params)
+    start = time.perf_counter()
+    tree.fit(X[~test], y[~test])
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    predicted = tree.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    # Ordenação das classes para o top-k: a classe prevista primeiro, depois as mais frequentes no nó onde o exemplo parou
+    compiled, X_tree = tree.compiled, tree.transform(X_test)
+    scores = np.zeros((len(y_test), len(classes)))
+    scores[:, compiled.labels] = compiled.counts[compiled.predict_nodes(X_tree)]    # As classes da árvore são códigos em 0..k-1
+    scores[np.arange(len(y_test)), predicted] = np.inf
+    ranking = np.argsort(-scores, axis=1, kind='stable')
+    result = {
+        'fold': fold,
+        'n_test': int(test.sum()),
+        'fit_time': fit_time,
+        'predict_time': predict_time,
+        'accuracy': float(np.mean(predicted == y_test)),
+        'top_k': {k: float(np.mean((ranking[:, :k] == y_test[:, None]).any(axis=1))) for k in top_k},
+    }
+    if _shared['legal']:
+        legal = compiled.predict(X_tree, legal_move_mask(X_test, classes[compiled.labels]))
+        result['legal_accuracy'] = float(np.mean(legal == y_test))
+    return result
+
+
+def cross_validate(X, y, n_folds=5, n_jobs=-1, seed=42, top_k=(1, 2, 3), legal_moves=None, **params):
+    '''Validação cruzada k-fold da DecisionTree(**params), com os folds em paralelo.
+    legal_moves: calcula a accuracy restrita às jogadas legais (por omissão, se X tiver 42 atributos e as classes
+    forem colunas do tabuleiro). Devolve (resultados de cada fold, resumo com média e variância)'''
+    if n_folds < 2:
+        raise ValueError("n_folds deve ser pelo menos 2")
+    X, y, classes = encode_dataset(X, y)
+    if legal_moves is None:
+        legal_moves = (X.shape[1] == 42 and np.issubdtype(classes.dtype, np.integer)
+                       and classes.min() >= 0 and classes.max() < COLS)
+    folds = (np.random.default_rng(seed).permutation(len(y)) % n_folds).astype(np.int8)   # Fold de cada exemplo
+
+    n_jobs = min(DecisionTree(n_jobs=n_jobs).effective_n_jobs(), n_folds)
+    tasks = [(fold, params, top_k) for fold in range(n_folds)]
+    if n_jobs > 1:
+        with SharedArrays({'X': X, 'y': y, 'folds': folds}) as shared, \
+                ProcessPoolExecutor(n_jobs, initializer=_attach_arrays, initargs=(shared.spec, classes, legal_moves)) as pool:
+            results = list(pool.map(_run_fold, *zip(*tasks)))
+    else:
+        _shared.update(X=X, y=y, folds=folds, classes=classes, legal=legal_moves)
+        try:
+            results = [_run_fold(*task) for task in tasks]
+        finally:
+            _shared.clear()
+
+    summary = {}
+    metrics = ['accuracy', 'fit_time', 'predict_time'] + (['legal_accuracy'] if legal_moves else [])
+    for metric in metrics:
+        values = np.array([result[metric] for result in results])
+        summary[metric] = (values.mean(), values.var())
+    for k in top_k:
+        values = np.array([result['top_k'][k] for result in results])
+        summary[f'top_{k}'] = (values.mean(), values.var())
+    return results, summary
+
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else "dataset_quatro_em_linha_mcts.csv"
+    df = pd.read_csv(filename)
+    X = df.iloc[:, :-1].values
+    y = df.iloc[:, -1].values
+
+    results, summary = cross_validate(X, y, n_folds=5, max_depth=12)
+    for result in results:
+        line = (f"Fold {result['fold']}: accuracy {result['accuracy']:.4f} | "
+                f"treino {result['fit_time']:.2f}s | previsão {result['predict_time'] * 1000:.1f}ms")
+        if 'legal_accuracy' in result:
+            line += f" | jogadas legais {result['legal_accuracy']:.4f}"
+        print(line)
+    print("-" * 30)
+    for metric, (mean, var) in summary.items():
+        print(f"{metric}: média {mean:.4f}, variância {var:.6f}")
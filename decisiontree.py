@@ -1,42 +1,277 @@
 # decisiontree.py
 
+import os
+import json
+import time
+import struct
+import hashlib
+import functools
+import itertools
 import numpy as np
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
 import pickle
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
 import random
+from boardfeatures import with_board_features, legal_move_mask, column_preference
 
 class Node:
-    __slots__ = ['feature', 'threshold', 'branches', 'value']
-    def __init__(self, feature=None, threshold=None, branches=None, value=None):
+    __slots__ = ['feature', 'threshold', 'branches', 'value', 'counts', 'label']
+    def __init__(self, feature=None, threshold=None, branches=None, value=None, counts=None, label=None):
         '''Estrutura de cada nó da árvore de decisão'''
         self.feature = feature           # Índice/Posição do atributo para o split
         self.threshold = threshold       # Limitador escolhido, utilizado apenas para atributos numéricos
         self.branches = branches or {}   # Dicionário com ramos da árvore. Para atributos categóricos, a chave é o valor do atributo
         self.value = value               # Classe se for folha
+        self.counts = counts             # Nº de exemplos de treino de cada classe (pela ordem de classes_) que chegaram ao nó
+        self.label = label               # Nos nós internos: a classe que o nó teria se fosse folha
 
     def is_leaf_node(self):
         '''Verifica se o nó é folha'''
         return self.value is not None     # Se o nó é folha, retorna True
 
 
+class CompiledTree:
+    '''Forma compacta da árvore em arrays numpy, para prever muitos exemplos de uma vez.
+    Os nós são numerados em largura (a raiz é o nó 0):
+        - feature[n]: atributo usado no nó n (-1 nas folhas)
+        - threshold[n]: limiar dos nós numéricos (nan nos categóricos e nas folhas)
+        - left[n] / right[n]: filhos dos nós numéricos
+        - offset[n]: início, em children, da tabela valor -> filho do nó categórico n (-1 se o ramo não existe)
+        - label[n]: índice, em labels, da classe prevista no nó (nos nós internos, para os exemplos sem ramo; -1 se desconhecida)
+        - counts[n, c]: nº de exemplos de treino da classe labels[c] que chegaram ao nó (None se a árvore não tem as contagens)
+    Os valores de cada atributo categórico são codificados pela posição na tabela ordenada values[feat]'''
+    __slots__ = ['feature', 'threshold', 'left', 'right', 'offset', 'children', 'label', 'counts', 'labels', 'values', 'default']
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'offset', 'children', 'label', 'counts')
+
+    def __init__(self, feature, threshold, left, right, offset, children, label, labels, values, default, counts=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.offset = offset
+        self.children = children
+        self.label = label
+        self.counts = counts
+        self.labels = labels
+        self.values = values          # Dicionário atributo categórico -> valores ordenados
+        self.default = default        # Índice da classe usada quando um valor não tem ramo
+
+    @classmethod
+    def from_tree(cls, root, default_class, classes=None):
+        '''Numera os nós da árvore em largura e copia-os para arrays.
+        classes é a ordem das classes nas contagens dos nós (classes_ da árvore); sem ela não são guardadas contagens'''
+        nodes = [root]
+        for node in nodes:              # A lista cresce durante o ciclo (percurso em largura)
+            nodes.extend(node.branches.values())
+        index = {id(node): i for i, node in enumerate(nodes)}
+
+        # Tabela de valores de cada atributo categórico: todas as chaves dos ramos que o usam
+        keys = {}
+        for node in nodes:
+            if not node.is_leaf_node() and node.threshold is None:
+                keys.setdefault(node.feature, set()).update(node.branches)
+        values = {feat: np.array(sorted(feat_keys)) for feat, feat_keys in keys.items()}
+
+        n_nodes = len(nodes)
+        feature = np.full(n_nodes, -1, dtype=np.int32)
+        threshold = np.full(n_nodes, np.nan)
+        left = np.full(n_nodes, -1, dtype=np.int32)
+        right = np.full(n_nodes, -1, dtype=np.int32)
+        offset = np.full(n_nodes, -1, dtype=np.int32)
+        label = np.full(n_nodes, -1, dtype=np.int32)
+        children = []
+        labels = {} if classes is None else {c: i for i, c in enumerate(classes)}
+        counts = None
+        if classes is not None and all(node.counts is not None for node in nodes):
+            counts = np.zeros((n_nodes, len(classes)), dtype=np.int64)
+            for i, node in enumerate(nodes):
+                counts[i, :len(node.counts)] = node.counts
+            counts = counts.astype(np.min_scalar_type(int(counts.max(initial=0))))    # O menor tipo sem sinal que chega
+
+        for i, node in enumerate(nodes):
+            if node.is_leaf_node():
+                label[i] = labels.setdefault(node.value, len(labels))
+                continue
+            if node.label is not None:
+                label[i] = labels.setdefault(node.label, len(labels))
+            feature[i] = node.feature
+            if node.threshold is not None:        # Numérico
+                threshold[i] = node.threshold
+                if 'left' in node.branches:
+                    left[i] = index[id(node.branches['left'])]
+                if 'right' in node.branches:
+                    right[i] = index[id(node.branches['right'])]
+            else:                                 # Categórico: tabela densa com uma entrada por valor do atributo
+                offset[i] = len(children)
+                for value in values[node.feature]:
+                    child = node.branches.get(value)
+                    children.append(index[id(child)] if child is not None else -1)
+
+        default = labels.setdefault(default_class, len(labels))
+        if counts is not None and counts.shape[1] < len(labels):     # Classes que só aparecem como default
+            counts = np.pad(counts, ((0, 0), (0, len(labels) - counts.shape[1])))
+        return cls(feature, threshold, left, right, offset, np.array(children, dtype=np.int32),
+                   label, np.array(list(labels)), values, default, counts)
+
+    def to_tree(self):
+        '''Reconstrói a árvore de objetos Node (para imprimir/desenhar um modelo carregado de ficheiro)'''
+        nodes = []
+        for i in range(len(self.feature)):
+            counts = None if self.counts is None else np.asarray(self.counts[i], dtype=np.int64)
+            if self.feature[i] < 0:
+                nodes.append(Node(value=self.labels[self.label[i]], counts=counts))
+                continue
+            label = self.labels[self.label[i]] if self.label[i] >= 0 else None
+            if np.isnan(self.threshold[i]):
+                nodes.append(Node(feature=int(self.feature[i]), counts=counts, label=label))
+            else:
+                nodes.append(Node(feature=int(self.feature[i]), threshold=float(self.threshold[i]), counts=counts, label=label))
+        for i, node in enumerate(nodes):
+            if node.is_leaf_node():
+                continue
+            if node.threshold is not None:
+                for key, child in (('left', self.left[i]), ('right', self.right[i])):
+                    if child >= 0:
+                        node.branches[key] = nodes[child]
+            else:
+                table = self.children[self.offset[i]:self.offset[i] + len(self.values[node.feature])]
+                for value, child in zip(self.values[node.feature], table):
+                    if child >= 0:
+                        node.branches[value] = nodes[child]
+        return nodes[0]
+
+    def encode(self, X):
+        '''Matriz de floats com os valores numéricos e, nos atributos categóricos, o código do valor (-1 se desconhecido)'''
+        encoded = np.zeros(X.shape, dtype=np.float64)
+        for feat in np.unique(self.feature[self.feature >= 0]):
+            column = X[:, feat]
+            table = self.values.get(feat)
+            if table is None:
+                encoded[:, feat] = column
+            elif table.dtype.kind in 'iu' and column.dtype.kind in 'iu':
+                # Valores inteiros (ex.: 0/1/2 das células do tabuleiro): tabela de consulta direta
+                lookup = np.full(int(table[-1] - table[0]) + 1, -1)
+                lookup[table - table[0]] = np.arange(len(table))
+                pos = column - table[0]
+                inside = (pos >= 0) & (pos < len(lookup))
+                encoded[:, feat] = np.where(inside, lookup[np.where(inside, pos, 0)], -1)
+            else:
+                pos = np.minimum(np.searchsorted(table, column), len(table) - 1)
+                encoded[:, feat] = np.where(table[pos] == column, pos, -1)
+        return encoded
+
+    def predict_nodes(self, X):
+        '''Nó onde cada exemplo termina: uma folha, ou o nó interno sem ramo para o valor do exemplo.
+        Todos os exemplos descem a árvore ao mesmo tempo, um nível por iteração'''
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        values = self.encode(X)
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int32)
+        while rows.size:
+            current = node[rows]
+            feats = self.feature[current]
+            inner = feats >= 0                              # Os exemplos que chegaram a uma folha param
+            rows, current, feats = rows[inner], current[inner], feats[inner]
+            val = values[rows, feats]
+            thr = self.threshold[current]
+            numerical = ~np.isnan(thr)
+
+            child = np.empty(len(rows), dtype=np.int32)
+            num_nodes = current[numerical]
+            child[numerical] = np.where(val[numerical] <= thr[numerical], self.left[num_nodes], self.right[num_nodes])
+            categorical = ~numerical
+            codes = val[categorical].astype(np.int32)
+            cat_child = np.full(len(codes), -1, dtype=np.int32)
+            seen = codes >= 0
+            cat_child[seen] = self.children[self.offset[current[categorical]][seen] + codes[seen]]
+            child[categorical] = cat_child
+
+            found = child >= 0                    # Sem ramo para o valor: o exemplo fica neste nó
+            rows = rows[found]
+            node[rows] = child[found]
+        return node
+
+    def predict_codes(self, X, allowed=None, preference=None):
+        '''Índice (em labels) da classe prevista para cada exemplo. Um exemplo que não chega a uma folha
+        (valor sem ramo) fica com a classe do nó interno onde parou, ou com default se o nó não a tiver.
+        allowed: matriz booleana (exemplos x labels) com as classes permitidas; quando a classe prevista não é
+        permitida, fica a permitida com mais exemplos de treino no nó (desempate pela distribuição na raiz).
+        Nas árvores sem contagens (ex.: convertidas do formato antigo) fica a permitida com maior preference
+        (uma pontuação por classe de labels) ou, sem preference, a classe default e depois a ordem de labels'''
+        node = self.predict_nodes(X)
+        codes = np.where(self.label[node] >= 0, self.label[node], self.default).astype(np.int32)
+        if allowed is None:
+            return codes
+        allowed = np.asarray(allowed, dtype=bool)
+        blocked = np.flatnonzero(~allowed[np.arange(len(codes)), codes])
+        if blocked.size:
+            if self.counts is None:
+                if preference is None:
+                    preference = np.arange(len(self.labels)) == self.default
+                scores = np.tile(np.asarray(preference, dtype=np.float64), (blocked.size, 1))
+            else:
+                root = self.counts[0].astype(np.float64)
+                scores = self.counts[node[blocked]] + root / (root.sum() + 1)    # O desempate vale menos do que 1 exemplo
+            scores[~allowed[blocked]] = -np.inf
+            codes[blocked] = np.argmax(scores, axis=1)
+        return codes
+
+    def predict(self, X, allowed=None, preference=None):
+        '''Classe prevista para cada exemplo (ver predict_codes)'''
+        return self.labels[self.predict_codes(X, allowed, preference)]
+
+
+MODEL_FILE = "decision_tree.dtm"                 # Ficheiro do modelo (formato binário descrito em DecisionTree.save)
+MODEL_MAGIC = b"DTMODEL\0"
+MODEL_VERSION = 1
+MODEL_CONTENT_VERSION = 2                        # Conteúdo dos modelos treinados (2: contagens por nó); faz parte da chave da cache
+MODEL_ALIGN = 64                                 # Alinhamento (em bytes) de cada array no ficheiro
+MODEL_CACHE_DIR = ".model_cache"                 # Pasta com os modelos treinados pelo DecisionTree_Player
+TRAINING_DATASET = "dataset_quatro_em_linha_mcts.csv"   # Dataset com que o DecisionTree_Player treina os seus modelos
+BOARD_ROWS, BOARD_COLS = 6, 7                    # Dimensões do tabuleiro achatado recebido pelo DecisionTree_Player
+PREDICTION_CACHE_SIZE = 4096                     # Nº máximo de posições guardadas na cache de previsões do jogador
+BOARD_FEATURES_MAX_DEPTH = 7                     # Profundidade da árvore do jogador com atributos derivados do tabuleiro
+STREAM_MIN_BYTES = 256 * 1024 * 1024             # Datasets maiores do que isto são treinados por blocos (fit_stream) pelo jogador
+STREAM_CHUNKSIZE = 50000                         # Linhas por bloco no treino por blocos
+
+PARALLEL_MIN_SAMPLES = 5000     # Nós com menos exemplos avaliam os atributos sem threads
+SUBTREES_PER_JOB = 4            # Nº de subárvores por processo antes de entregar a fronteira ao pool
+
+
 class DecisionTree:
-    def __init__(self, random_state=None, min_samples_split=2, max_depth=100):
+    MODEL_EXTENSION = ".dtm"
+
+    def __init__(self, random_state=None, min_samples_split=2, max_depth=100, n_jobs=1, max_features=None,
+                 board_features=False, profile=False):
         '''Parâmetros da árvore de decisão'''
         self.root = None                                # Raiz da árvore
         self.random_state = random_state                # Para garantir aleatoriedade
         self.most_common_class = None                   # Classe mais comum para previsões
+        self.compiled = None                            # Árvore em arrays (CompiledTree), usada pelo predict
         self.min_samples_split = min_samples_split      # Número mínimo de amostras para dividir um nó
         self.max_depth = max_depth                      # Profundidade máxima da árvore
+        self.n_jobs = n_jobs                            # Nº de processos/threads no treino (-1 = todos os CPUs)
+        self.max_features = max_features                # Atributos sorteados em cada nó: None (todos), int, fração, 'sqrt' ou 'log2'
+        self.board_features = board_features            # Acrescenta às células do tabuleiro os atributos derivados (ver boardfeatures.py)
+        self.profile = profile                          # Regista, em node_profile, o custo do treino de cada nó (ver profile_summary)
+        self.node_profile = None
+        self.fit_time = None
+        self._thread_pool = None
+        self._n_split_feats = None
+        self._rng = None
 
         if random_state is not None:
             np.random.seed(random_state)
 
     def fit(self, X, y):
         '''Constrói a árvore de decisão a partir dos dados'''
-        X = np.array(X)    # Converte para numpy 
+        X = self.transform(np.array(X))    # Converte para numpy 
         y = np.array(y)
 
         n_feats = X.shape[1]                                    # Número de atributos é o número de colunas do dataset
@@ -48,87 +283,635 @@ class DecisionTree:
                 self.feature_types.append("categorical")
             else:
                 self.feature_types.append("numerical")
-        self.root = self.grow_tree(X, y, n_feats=n_feats)       # Começa a construir a árvore
+
+        self._rng = np.random.default_rng(self.random_state)   # Sorteio dos atributos de cada nó
+        self._n_split_feats = self.resolve_max_features(n_feats)
+        self.node_profile = [] if self.profile else None
+        start = time.perf_counter()
+
+        sorted_rows = self.prepare_training_data(X, y)         # Codifica/ordena cada atributo uma única vez
+        n_jobs = self.effective_n_jobs()
+        try:
+            if n_jobs > 1:
+                self._thread_pool = ThreadPoolExecutor(n_jobs)
+                self.root = self.grow_tree_parallel(np.arange(len(y)), n_jobs, n_feats, sorted_rows)
+            else:
+                self.root = self.grow_tree(np.arange(len(y)), n_feats=n_feats, sorted_rows=sorted_rows)   # Começa a construir a árvore
+        finally:
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown()
+                self._thread_pool = None
+            self.release_training_data()
         self.most_common_class = self.most_common_label(y)      # Garante que a árvore tem sempre uma resposta possível
+        self.compile()
+        self.fit_time = time.perf_counter() - start
 
-    def grow_tree(self, X, y, depth=0, n_feats=None, used_features_count=None):
-        '''Cria a árvore de decisão recursivamente'''
-        n_samples, n_features = X.shape
-        n_labels = len(np.unique(y))
+    def truncated(self, max_depth=None, min_samples_split=None):
+        '''Árvore igual à que fit daria com um max_depth menor e/ou um min_samples_split maior, obtida cortando esta
+        (o split de cada nó não depende destes dois parâmetros; só decidem onde a árvore pára)'''
+        if self.root is None or getattr(self.root, 'counts', None) is None:
+            raise ValueError("Só é possível cortar uma árvore treinada nesta sessão (com as contagens de cada nó)")
+        max_depth = self.max_depth if max_depth is None else max_depth
+        min_samples_split = self.min_samples_split if min_samples_split is None else min_samples_split
+        if max_depth > self.max_depth or min_samples_split < self.min_samples_split:
+            raise ValueError("Só é possível cortar para um max_depth menor ou um min_samples_split maior")
+
+        tree = DecisionTree(random_state=self.random_state, min_samples_split=min_samples_split,
+                            max_depth=max_depth, n_jobs=self.n_jobs, max_features=self.max_features,
+                            board_features=self.board_features)
+        tree.feature_types = self.feature_types
+        tree.classes_ = self.classes_
+        tree.most_common_class = self.most_common_class
+        tree.root = self.truncate_node(self.root, 0, max_depth, min_samples_split)
+        tree.compile()
+        return tree
+
+    def truncate_node(self, node, depth, max_depth, min_samples_split):
+        '''Cópia da subárvore de node, com folhas nos nós onde fit pararia com os novos parâmetros'''
+        if node.is_leaf_node():
+            return node
+        if depth >= max_depth or node.counts.sum() < min_samples_split:
+            return Node(value=node.label, counts=node.counts)
+        branches = {key: self.truncate_node(child, depth + 1, max_depth, min_samples_split)
+                    for key, child in node.branches.items()}
+        return Node(node.feature, node.threshold, branches, counts=node.counts, label=node.label)
+
+    @classmethod
+    def grid_search(cls, X_train, y_train, X_val, y_val, param_grid, n_jobs=1):
+        '''Procura em grelha dos hiperparâmetros, avaliada no conjunto de validação.
+        As combinações que só diferem em max_depth/min_samples_split partilham um único treino: a árvore mais funda
+        é treinada uma vez e as outras são obtidas com truncated(). Os treinos restantes correm em paralelo (n_jobs).
+        Devolve (melhor árvore, melhores parâmetros, [(parâmetros, accuracy)]).
+        Em caso de empate na accuracy fica a combinação com menor max_depth (e, depois, a primeira da grelha)'''
+        names = list(param_grid)
+        candidates = [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+        defaults = cls()
+
+        # Agrupa as combinações pelos parâmetros que não se obtêm cortando a árvore
+        groups = {}
+        for params in candidates:
+            key = tuple(sorted((name, value) for name, value in params.items()
+                               if name not in ('max_depth', 'min_samples_split')))
+            groups.setdefault(key, []).append(params)
+        fit_params = []
+        for key, group in groups.items():
+            fit_params.append({**dict(key),
+                               'max_depth': max(p.get('max_depth', defaults.max_depth) for p in group),
+                               'min_samples_split': min(p.get('min_samples_split', defaults.min_samples_split) for p in group)})
+
+        X_train, y_train = np.asarray(X_train), np.asarray(y_train)
+        if isinstance(X_val, pd.DataFrame):
+            X_val = X_val.values
+        y_val = np.asarray(y_val)
+        n_jobs = min(cls(n_jobs=n_jobs).effective_n_jobs(), len(fit_params))
+        if n_jobs > 1:
+            with ProcessPoolExecutor(n_jobs) as pool:
+                trees = list(pool.map(_fit_tree, fit_params, [X_train] * len(fit_params), [y_train] * len(fit_params)))
+        else:
+            trees = [_fit_tree(params, X_train, y_train) for params in fit_params]
+        full_trees = dict(zip(groups, trees))
+
+        evaluated = {}
+        for key, group in groups.items():
+            for params in group:
+                tree = full_trees[key].truncated(params.get('max_depth'), params.get('min_samples_split'))
+                evaluated[id(params)] = (tree, np.mean(tree.predict(X_val) == y_val))
+
+        results, best = [], None
+        for params in candidates:           # Pela ordem da grelha, para os desempates
+            tree, accuracy = evaluated[id(params)]
+            results.append((params, accuracy))
+            depth = params.get('max_depth', defaults.max_depth)
+            if best is None or accuracy > best[0] or (accuracy == best[0] and depth < best[1]):
+                best = (accuracy, depth, tree, params)
+        return best[2], best[3], results
+
+    def fit_stream(self, filename, chunksize=STREAM_CHUNKSIZE, max_rows_in_memory=100000, test_size=0.0, split_seed=42):
+        '''Constrói a árvore lendo o CSV por blocos de chunksize linhas, sem carregar o dataset inteiro.
+        Com test_size > 0 treina só com as linhas de treino da divisão por hash das linhas (ver hash_split).
+        Só para atributos categóricos (inteiros), como as células do tabuleiro. A árvore cresce nível a nível:
+            - em cada leitura do ficheiro, cada linha é encaminhada pela árvore parcial até ao seu nó da fronteira,
+              e cada nó acumula a tabela (atributo, valor, classe), que chega para escolher o split
+            - os nós com até max_rows_in_memory linhas são materializados: as suas linhas são guardadas e a
+              subárvore é construída em memória, com o treino normal
+        A memória depende de chunksize e de max_rows_in_memory, não do tamanho do dataset.
+        Sem max_features, a árvore é igual à de fit com os mesmos dados'''
+        start = time.perf_counter()
+        # 1ª leitura: classes, valores de cada atributo e 1ª linha de cada classe (desempates, como no Counter)
+        classes, values, first_rows, n_rows = None, None, {}, 0
+        for X, y in self.read_chunks(filename, chunksize, test_size, split_seed):
+            if values is None:
+                values = [np.unique(X[:, feat]) for feat in range(X.shape[1])]
+            else:
+                values = [np.union1d(values[feat], X[:, feat]) for feat in range(X.shape[1])]
+            chunk_classes, first = np.unique(y, return_index=True)
+            for label, row in zip(chunk_classes, first):
+                first_rows.setdefault(label, n_rows + row)
+            classes = chunk_classes if classes is None else np.union1d(classes, chunk_classes)
+            n_rows += len(y)
+        if not n_rows:
+            raise ValueError(f"'{filename}' não tem exemplos")
+
+        n_feats = len(values)
+        self.feature_types = ["categorical"] * n_feats
+        self.node_profile = [] if self.profile else None
+        self._rng = np.random.default_rng(self.random_state)
+        self._n_split_feats = self.resolve_max_features(n_feats)
+        self.classes_, self._n_classes = classes, len(classes)
+        self._cat_feats = list(range(n_feats))
+        self._cat_position = {feat: feat for feat in range(n_feats)}
+        self._feature_values = dict(enumerate(values))
+        self._n_values = max(len(v) for v in values)
+        table_size = n_feats * self._n_values * self._n_classes
+
+        root_holder = {'root': Node()}
+        # Nós por construir: (ramos do pai, chave, profundidade, atributos usados, nº de linhas).
+        # Cada um tem, na árvore parcial, um nó marcador (vazio) que é substituído quando o nó é construído
+        pending = [(root_holder, 'root', 0, {}, n_rows)]
+        decided = set()          # Nós internos escolhidos a partir das tabelas (a árvore parcial a percorrer)
+        while pending:
+            # Nós pequenos são materializados (até max_rows_in_memory linhas por leitura); os outros acumulam tabelas
+            histogram, materialise, deferred, budget = [], [], [], max_rows_in_memory
+            for entry in pending:
+                if entry[4] > max_rows_in_memory:
+                    histogram.append(entry)
+                elif entry[4] <= budget:
+                    materialise.append(entry)
+                    budget -= entry[4]
+                else:
+                    deferred.append(entry)
+            targets = {id(entry[0][entry[1]]): i for i, entry in enumerate(histogram + materialise)}
+
+            tables = np.zeros((len(histogram), table_size), dtype=np.int64)
+            first = np.full((len(histogram), self._n_classes), n_rows, dtype=np.int64)
+            rows_X = [[] for _ in materialise]
+            rows_y = [[] for _ in materialise]
+            offset = 0
+            for X, y in self.read_chunks(filename, chunksize, test_size, split_seed):
+                target = np.full(len(y), -1)
+                self.route_rows(root_holder['root'], np.arange(len(y)), X, targets, decided, target)
+                hist_rows = np.flatnonzero((target >= 0) & (target < len(histogram)))
+                if len(hist_rows):
+                    codes = np.column_stack([np.searchsorted(values[feat], X[hist_rows, feat]) for feat in range(n_feats)])
+                    y_codes = np.searchsorted(classes, y[hist_rows])
+                    cells = (codes * self._n_classes + y_codes[:, None]
+                             + np.arange(n_feats) * (self._n_values * self._n_classes))
+                    cells += (target[hist_rows] * table_size)[:, None]
+                    tables += np.bincount(cells.ravel(), minlength=tables.size).reshape(tables.shape)
+                    np.minimum.at(first, (target[hist_rows], y_codes), offset + hist_rows)
+                for i in range(len(materialise)):
+                    node_rows = np.flatnonzero(target == len(histogram) + i)
+                    rows_X[i].append(X[node_rows])
+                    rows_y[i].append(y[node_rows])
+                offset += len(y)
+
+            pending = deferred
+            for (branches, key, depth, used_counts, _), table, first_row in zip(histogram, tables, first):
+                node, children, child_used_counts = self.split_from_table(
+                    table.reshape(n_feats, self._n_values, self._n_classes), first_row, depth, used_counts)
+                branches[key] = node
+                if children:
+                    decided.add(id(node))
+                    for child_key, n_child in children:
+                        node.branches[child_key] = Node()      # Marcador: mantém a ordem dos ramos de fit
+                        pending.append((node.branches, child_key, depth + 1, child_used_counts, n_child))
+
+            for (branches, key, depth, used_counts, _), X_parts, y_parts in zip(materialise, rows_X, rows_y):
+                X, y = np.concatenate(X_parts), np.concatenate(y_parts)
+                sorted_rows = self.prepare_training_data(X, y, classes=classes, feature_values=self._feature_values)
+                try:
+                    branches[key] = self.grow_tree(np.arange(len(y)), depth, n_feats, used_counts, sorted_rows)
+                finally:
+                    self.release_training_data()
+
+        self.root = root_holder['root']
+        totals = self.root.counts
+        tied = np.flatnonzero(totals == totals.max())
+        self.most_common_class = min(classes[tied], key=lambda label: first_rows[label])
+        self.compile()
+        self.fit_time = time.perf_counter() - start
+        return self
+
+    def read_chunks(self, filename, chunksize, test_size=0.0, split_seed=42):
+        '''Lê as linhas de treino do CSV por blocos (ver read_csv_chunks); devolve (X, y) de cada bloco, já transformados'''
+        for X, y in read_csv_chunks(filename, chunksize, test_size, split_seed, subset='train'):
+            if not np.issubdtype(X.dtype, np.integer):
+                raise ValueError("O treino por blocos só suporta atributos categóricos (inteiros)")
+            yield self.transform(X), y
+
+    def route_rows(self, node, rows, X, targets, decided, target):
+        '''Encaminha as linhas de um bloco pela árvore parcial; target[linha] fica com o nº do nó da fronteira'''
+        if not len(rows):
+            return
+        if id(node) in targets:
+            target[rows] = targets[id(node)]
+        elif id(node) in decided:
+            val = X[rows, node.feature]
+            for key, child in node.branches.items():
+                self.route_rows(child, rows[val == key], X, targets, decided, target)
+
+    def split_from_table(self, table, first_row, depth, used_features_count):
+        '''Mesmo critério de split_node, mas a partir da tabela (atributo, valor, classe) do nó.
+        first_row tem a 1ª linha de cada classe no nó, para os desempates.
+        Devolve (nó, [(ramo, nº de linhas do filho)], contador de atributos usados pelos filhos)'''
+        class_counts = table[0].sum(axis=0)
+        n_samples = int(class_counts.sum())
+        n_labels = np.count_nonzero(class_counts)
+
+        tied = np.flatnonzero(class_counts == class_counts.max())
+        leaf = Node(value=self.classes_[tied[int(np.argmin(first_row[tied]))]], counts=class_counts)
+        if (depth >= self.max_depth or n_labels == 1 or n_samples < self.min_samples_split):
+            self.record_node(depth, n_samples)
+            return leaf, [], None
+
+        feat_idxs = [i for i in range(len(self.feature_types)) if used_features_count.get(i, 0) < 2]
+        if not feat_idxs:
+            self.record_node(depth, n_samples)
+            return leaf, [], None
+        if self._n_split_feats is not None and len(feat_idxs) > self._n_split_feats:
+            feat_idxs = sorted(self._rng.choice(feat_idxs, self._n_split_feats, replace=False).tolist())
+
+        start = time.perf_counter()
+        gains = self.gains_from_tables(table[feat_idxs], n_samples, self.entropy_from_counts(class_counts))
+        best = int(np.argmax(gains))
+        split_time = time.perf_counter() - start
+        if gains[best] == 0:
+            self.record_node(depth, n_samples, len(feat_idxs), split_time=split_time)
+            return leaf, [], None
+
+        best_feat = feat_idxs[best]
+        updated_used_counts = used_features_count.copy()
+        updated_used_counts[best_feat] = updated_used_counts.get(best_feat, 0) + 1
+        branch_sizes = table[best_feat].sum(axis=1)
+        children = [(self._feature_values[best_feat][code], int(branch_sizes[code]))
+                    for code in np.flatnonzero(branch_sizes)]
+        self.record_node(depth, n_samples, len(feat_idxs), best_feat, split_time)   # As linhas são partidas ao ler os blocos
+        return Node(feature=best_feat, threshold=None, counts=class_counts, label=leaf.value), children, updated_used_counts
+
+    def compile(self):
+        '''Gera a forma em arrays da árvore (deve ser chamado sempre que a árvore muda)'''
+        self.compiled = CompiledTree.from_tree(self.root, self.most_common_class, getattr(self, 'classes_', None))
+        return self.compiled
+
+    def node_count(self):
+        '''Nº de nós da árvore'''
+        return len(self.compiled.feature)
+
+    def model_nbytes(self):
+        '''Tamanho, em bytes, dos arrays da forma compilada (o grosso do ficheiro guardado por save)'''
+        return sum(getattr(self.compiled, name).nbytes for name in CompiledTree.ARRAYS
+                   if getattr(self.compiled, name) is not None)
+
+    def prune(self, X_val, y_val, tolerance=0.0, alphas=None):
+        '''Poda de custo-complexidade (cost-complexity pruning), escolhida com um conjunto de validação.
+        Para cada alpha, cada nó interno passa a folha quando os erros de treino da folha + alpha
+        não excedem o custo da melhor poda da subárvore (erros + alpha por folha).
+        Fica a árvore mais pequena cuja accuracy na validação não desce mais do que tolerance. Devolve o alpha escolhido'''
+        if self.root is None or getattr(self.root, 'counts', None) is None:
+            raise ValueError("A poda precisa de uma árvore treinada nesta sessão (com as contagens de cada nó)")
+        if alphas is None:
+            alphas = np.concatenate(([0.0], np.geomspace(0.25, 64, 9)))
+        if isinstance(X_val, pd.DataFrame):
+            X_val = X_val.values
+        X_val = self.transform(X_val)
+        y_val = np.asarray(y_val)
+
+        target = np.mean(self.compiled.predict(X_val) == y_val) - tolerance
+        best_alpha, best_root, best_size = None, self.root, self.node_count()
+        for alpha in sorted(alphas):
+            root, _ = self.pruned_subtree(self.root, alpha)
+            compiled = CompiledTree.from_tree(root, self.most_common_class, self.classes_)
+            if len(compiled.feature) < best_size and np.mean(compiled.predict(X_val) == y_val) >= target:
+                best_alpha, best_root, best_size = alpha, root, len(compiled.feature)
+        self.root = best_root
+        self.compile()
+        return best_alpha
+
+    def pruned_subtree(self, node, alpha):
+        '''Cópia da subárvore de node com a poda de custo-complexidade alpha. Devolve (nó, custo)'''
+        leaf_cost = node.counts.sum() - node.counts.max() + alpha     # Erros de treino se o nó for folha
+        if node.is_leaf_node():
+            return node, leaf_cost
+        branches, subtree_cost = {}, 0
+        for key, child in node.branches.items():
+            branches[key], child_cost = self.pruned_subtree(child, alpha)
+            subtree_cost += child_cost
+        if leaf_cost <= subtree_cost:
+            return Node(value=node.label, counts=node.counts), leaf_cost
+        return Node(node.feature, node.threshold, branches, counts=node.counts, label=node.label), subtree_cost
+
+    def prepare_training_data(self, X, y, classes=None, feature_values=None):
+        '''Prepara os dados de treino uma única vez, na raiz:
+            - as classes são codificadas em 0..k-1
+            - cada atributo categórico é codificado pelos seus valores únicos, e é guardada a "célula"
+              (atributo, valor, classe) de cada exemplo, para construir as tabelas de contingência com um bincount
+            - cada atributo numérico é ordenado uma vez; devolve {atributo: linhas ordenadas por esse atributo}
+        Os nós da árvore trabalham só com índices de linhas destes arrays, sem copiar a matriz de atributos.
+        classes/feature_values fixam as tabelas de classes e de valores (treino por blocos, ver fit_stream)'''
+        if classes is None:
+            self.classes_, y_codes = np.unique(y, return_inverse=True)
+        else:
+            self.classes_, y_codes = classes, np.searchsorted(classes, y)
+        self._y_codes = y_codes
+        self._n_classes = len(self.classes_)
+        self._X = X
+
+        self._cat_feats = [i for i, t in enumerate(self.feature_types) if t == "categorical"]
+        self._cat_position = {feat: pos for pos, feat in enumerate(self._cat_feats)}
+        self._feature_values = {}
+        codes = np.empty((len(y), len(self._cat_feats)), dtype=np.int32)
+        for pos, feat in enumerate(self._cat_feats):
+            if feature_values is None:
+                self._feature_values[feat], codes[:, pos] = np.unique(X[:, feat], return_inverse=True)
+            else:
+                self._feature_values[feat] = feature_values[feat]
+                codes[:, pos] = np.searchsorted(feature_values[feat], X[:, feat])
+        self._codes = codes
+        self._n_values = max((len(v) for v in self._feature_values.values()), default=0)
+
+        # Índice da célula (atributo, valor, classe) de cada exemplo na tabela de contingência de todos os atributos
+        offsets = np.arange(len(self._cat_feats), dtype=np.int32) * (self._n_values * self._n_classes)
+        cells = codes * np.int32(self._n_classes)                  # Operações em int32, sem temporários em int64
+        cells += y_codes.astype(np.int32)[:, None]
+        cells += offsets
+        self._cells = cells
+
+        # Atributos numéricos: ordenação estável, feita só na raiz
+        sorted_rows = {}
+        for feat, feat_type in enumerate(self.feature_types):
+            if feat_type == "numerical":
+                sorted_rows[feat] = np.argsort(X[:, feat], kind='stable')
+        self._row_mask = np.zeros(len(y), dtype=bool)     # Máscara auxiliar para partir as listas ordenadas pelos filhos
+        return sorted_rows
+
+    def resolve_max_features(self, n_feats):
+        '''Nº de atributos sorteados em cada nó (None = todos)'''
+        max_features = self.max_features
+        if max_features is None:
+            return None
+        if max_features == 'sqrt':
+            n_split_feats = int(np.sqrt(n_feats))
+        elif max_features == 'log2':
+            n_split_feats = int(np.log2(n_feats))
+        elif isinstance(max_features, float) and 0 < max_features <= 1:
+            n_split_feats = int(max_features * n_feats)
+        elif isinstance(max_features, (int, np.integer)) and max_features > 0:
+            n_split_feats = int(max_features)
+        else:
+            raise ValueError("max_features deve ser None, um inteiro positivo, uma fração em ]0, 1], 'sqrt' ou 'log2'")
+        return max(1, min(n_split_feats, n_feats))
+
+    def effective_n_jobs(self):
+        '''Nº de processos a usar no treino'''
+        if self.n_jobs is None or self.n_jobs == 0:
+            return 1
+        if self.n_jobs < 0:
+            return os.cpu_count() or 1
+        return self.n_jobs
+
+    def release_training_data(self):
+        '''Liberta os arrays auxiliares do treino'''
+        for attr in ('_X', '_y_codes', '_codes', '_cells', '_row_mask'):
+            setattr(self, attr, None)
+
+    def grow_tree(self, idxs, depth=0, n_feats=None, used_features_count=None, sorted_rows=None):
+        '''Cria a árvore de decisão recursivamente a partir das linhas idxs dos dados de treino'''
+        node, children, child_used_counts = self.split_node(idxs, depth, n_feats, used_features_count, sorted_rows)
+        for key, child_idxs, child_sorted_rows in children:
+            node.branches[key] = self.grow_tree(child_idxs, depth + 1, n_feats, child_used_counts, child_sorted_rows)
+        return node
+
+    def grow_tree_parallel(self, idxs, n_jobs, n_feats=None, sorted_rows=None):
+        '''Cresce os primeiros níveis em largura; quando a fronteira tem subárvores suficientes para os processos,
+        entrega cada subárvore a um pool de processos que lê os dados de treino de memória partilhada'''
+        root_holder = {}
+        frontier = deque([(root_holder, 'root', idxs, 0, None, sorted_rows)])
+        while frontier and len(frontier) < n_jobs * SUBTREES_PER_JOB:
+            branches, key, node_idxs, depth, used_counts, node_sorted_rows = frontier.popleft()
+            node, children, child_used_counts = self.split_node(node_idxs, depth, n_feats, used_counts, node_sorted_rows)
+            branches[key] = node
+            for child_key, child_idxs, child_sorted_rows in children:
+                frontier.append((node.branches, child_key, child_idxs, depth + 1, child_used_counts, child_sorted_rows))
+
+        if frontier:
+            seeds = self._rng.integers(2**63, size=len(frontier))     # Sorteio dos atributos de cada subárvore, reprodutível
+            with SharedTrainingData(self) as shared:
+                with ProcessPoolExecutor(n_jobs, initializer=_attach_training_data, initargs=(shared.spec, shared.attributes)) as pool:
+                    futures = [(branches, key, pool.submit(_grow_subtree, node_idxs, depth, n_feats, used_counts, node_sorted_rows, seed))
+                               for (branches, key, node_idxs, depth, used_counts, node_sorted_rows), seed in zip(frontier, seeds)]
+                    for branches, key, future in futures:
+                        branches[key], node_profile = future.result()
+                        if self.node_profile is not None:
+                            self.node_profile.extend(node_profile)
+        return root_holder['root']
+
+    def split_node(self, idxs, depth, n_feats=None, used_features_count=None, sorted_rows=None):
+        '''Decide se o nó é folha ou escolhe o seu split.
+        Devolve (nó, [(ramo, linhas do filho, listas ordenadas do filho)], contador de atributos usados pelos filhos)'''
+        n_samples = len(idxs)
+        class_counts = np.bincount(self._y_codes[idxs], minlength=self._n_classes)
+        n_labels = np.count_nonzero(class_counts)
 
         if used_features_count is None:
             used_features_count = {}
 
         # Critérios de paragem
         if (depth >= self.max_depth or n_labels == 1 or n_samples < self.min_samples_split):
-            return Node(value=self.most_common_label(y))
+            self.record_node(depth, n_samples)
+            return Node(value=self.label_from_counts(class_counts, idxs), counts=class_counts), [], None
 
         if n_feats is None:
-            n_feats = n_features
+            n_feats = len(self.feature_types)
 
         # Só considerar atributos com uso < 2 neste caminho
         feat_idxs = [i for i in range(n_feats) if used_features_count.get(i, 0) < 2]
 
         # Se nenhum atributo está disponível, parar
         if not feat_idxs:
-            return Node(value=self.most_common_label(y))
+            self.record_node(depth, n_samples)
+            return Node(value=self.label_from_counts(class_counts, idxs), counts=class_counts), [], None
+
+        # Subamostragem de atributos em cada nó (florestas aleatórias)
+        if self._n_split_feats is not None and len(feat_idxs) > self._n_split_feats:
+            feat_idxs = sorted(self._rng.choice(feat_idxs, self._n_split_feats, replace=False).tolist())
 
         # Encontrar melhor split
-        best_feat, best_thresh, best_gain, best_split = self.best_split(X, y, feat_idxs)
+        start = time.perf_counter()
+        best_feat, best_thresh, best_gain = self.best_split(idxs, class_counts, feat_idxs, sorted_rows)
+        split_time = time.perf_counter() - start
 
         if best_gain == 0:
-            return Node(value=self.most_common_label(y))
+            self.record_node(depth, n_samples, len(feat_idxs), split_time=split_time)
+            return Node(value=self.label_from_counts(class_counts, idxs), counts=class_counts), [], None
 
         # Atualizar contador de atributos usados neste caminho
         updated_used_counts = used_features_count.copy()
         updated_used_counts[best_feat] = updated_used_counts.get(best_feat, 0) + 1
 
+        start = time.perf_counter()
         if self.feature_types[best_feat] == "categorical":
-            branches = {}
-            for val, idxs in best_split.items():
-                child = self.grow_tree(X[idxs, :], y[idxs], depth + 1, n_feats, updated_used_counts)
-                branches[val] = child
-            return Node(feature=best_feat, threshold=None, branches=branches)
-
+            node = Node(feature=best_feat, threshold=None, counts=class_counts,
+                        label=self.label_from_counts(class_counts, idxs))
+            children = self.partition_categorical(idxs, best_feat)
         else:  # numérico
-            left_idxs, right_idxs = best_split
-            left = self.grow_tree(X[left_idxs, :], y[left_idxs], depth + 1, n_feats, updated_used_counts)
-            right = self.grow_tree(X[right_idxs, :], y[right_idxs], depth + 1, n_feats, updated_used_counts)
-            branches = {'left': left, 'right': right}
-            return Node(feature=best_feat, threshold=best_thresh, branches=branches)
-
-    def best_split(self, X, y, feat_idxs):
-        '''Cálculo dos ganhos de informação para escolher o melhor split'''
-        best_gain = -1
-        best_feat, best_split = None, None
-        #print(f"A procurar o melhor split entre {len(feat_idxs)} atributos")
-        for feat in feat_idxs:
-            X_column = X[:, feat]
-
-            if self.is_categorical(X_column):
-                splits = self.split_categorical(X_column)
-                gain = self.information_gain(y, list(splits.values()))
-                #print(f"Atributo {feat} (categórico): ganho = {gain:.4f}")
-                if gain > best_gain:
-                    best_gain = gain
-                    best_feat = feat
-                    best_split = splits
-
-            else:  # Numérico
-                threshold, entropy_value = self.conditional_entropy_split(X_column, y)
-                if threshold is not None:
-                    gain = self.entropy(y) - entropy_value
-                    #print(f"Atributo {feat} (numérico) com threshold {threshold:.3f}: ganho = {gain:.4f}")
-                    if gain > best_gain:
-                        best_gain = gain
-                        best_feat = feat
-                        best_split = threshold
+            node = Node(feature=best_feat, threshold=best_thresh, counts=class_counts,
+                        label=self.label_from_counts(class_counts, idxs))
+            children = self.partition_numerical(idxs, best_feat, best_thresh, sorted_rows)
 
-        #print(f"Melhor split: atributo={best_feat}, ganho={best_gain:.4f}")
-        if self.is_categorical(X[:, best_feat]):
-            return best_feat, None, best_gain, best_split
+        # As listas ordenadas dos atributos numéricos são partidas pelos filhos, mantendo a ordem
+        children = [(key, child_idxs, self.partition_sorted_rows(child_idxs, sorted_rows))
+                    for key, child_idxs in children]
+        self.record_node(depth, n_samples, len(feat_idxs), best_feat, split_time, time.perf_counter() - start)
+        return node, children, updated_used_counts
+
+    def record_node(self, depth, n_samples, n_candidates=0, feature=None, split_time=0.0, partition_time=0.0):
+        '''Regista o custo do treino de um nó em node_profile (só com profile=True).
+        feature é None nas folhas; split_time é o tempo da procura do melhor split e partition_time o da partição das linhas'''
+        if self.node_profile is not None:
+            self.node_profile.append({'depth': depth, 'n_samples': int(n_samples), 'n_candidates': n_candidates,
+                                      'feature': None if feature is None else int(feature),
+                                      'split_time': split_time, 'partition_time': partition_time})
+
+    def profile_summary(self):
+        '''Resumo de node_profile: totais, e nº de nós, exemplos, atributos avaliados e tempos por profundidade
+        e por atributo escolhido no split. Os tempos estão em segundos'''
+        if self.node_profile is None:
+            raise ValueError("Sem registo do treino: é preciso treinar com profile=True")
+
+        def totals(records):
+            return {'nodes': len(records),
+                    'leaves': sum(1 for r in records if r['feature'] is None),
+                    'samples': sum(r['n_samples'] for r in records),
+                    'candidates': sum(r['n_candidates'] for r in records),
+                    'split_time': sum(r['split_time'] for r in records),
+                    'partition_time': sum(r['partition_time'] for r in records)}
+
+        by_depth, by_feature = {}, {}
+        for record in self.node_profile:
+            by_depth.setdefault(record['depth'], []).append(record)
+            if record['feature'] is not None:
+                by_feature.setdefault(record['feature'], []).append(record)
+        return {'fit_time': self.fit_time,
+                'total': totals(self.node_profile),
+                'by_depth': {depth: totals(by_depth[depth]) for depth in sorted(by_depth)},
+                'by_feature': {feat: totals(by_feature[feat]) for feat in sorted(by_feature)}}
+
+    def save_profile(self, filename, include_nodes=False):
+        '''Exporta o resumo do treino (e, com include_nodes, o registo de cada nó) em JSON,
+        com os hiperparâmetros, para comparar o custo do treino entre versões'''
+        report = {'params': {'max_depth': self.max_depth, 'min_samples_split': self.min_samples_split,
+                             'max_features': self.max_features, 'n_jobs': self.n_jobs,
+                             'board_features': self.board_features},
+                  **self.profile_summary()}
+        if include_nodes:
+            report['nodes'] = self.node_profile
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Perfil do treino guardado em '{filename}'.")
+
+    def partition_categorical(self, idxs, feat):
+        '''Parte as linhas do nó pelo valor do atributo categórico; cada filho é uma fatia de um único array'''
+        node_codes = self._codes[idxs, self._cat_position[feat]]
+        order = np.argsort(node_codes, kind='stable')
+        sorted_idxs = idxs[order]
+        counts = np.bincount(node_codes, minlength=len(self._feature_values[feat]))
+        ends = np.cumsum(counts)
+        children = []
+        for code in np.flatnonzero(counts):
+            children.append((self._feature_values[feat][code], sorted_idxs[ends[code] - counts[code]:ends[code]]))
+        return children
+
+    def partition_numerical(self, idxs, feat, threshold, sorted_rows):
+        '''Parte as linhas do nó em esquerda (<= threshold) e direita, usando a lista já ordenada pelo atributo'''
+        rows = sorted_rows[feat]
+        n_left = np.searchsorted(self._X[rows, feat], threshold, side='right')
+        return [('left', rows[:n_left]), ('right', rows[n_left:])]
+
+    def partition_sorted_rows(self, child_idxs, sorted_rows):
+        '''Filtra as listas ordenadas do nó pai para as linhas do filho, em O(linhas do nó)'''
+        if not sorted_rows:
+            return sorted_rows
+        mask = self._row_mask
+        mask[child_idxs] = True
+        child_sorted = {}
+        for feat, rows in sorted_rows.items():
+            child_sorted[feat] = rows[mask[rows]]
+        mask[child_idxs] = False
+        return child_sorted
+
+    def best_split(self, idxs, class_counts, feat_idxs, sorted_rows):
+        '''Cálculo dos ganhos de informação para escolher o melhor split.
+        Devolve (atributo, threshold ou None, ganho)'''
+        # Ganho de cada atributo, pela ordem de feat_idxs (-inf se o atributo não tem split possível)
+        gains = np.full(len(feat_idxs), -np.inf)
+        thresholds = {}
+        parent_entropy = self.entropy_from_counts(class_counts)
+
+        categorical = [i for i, feat in enumerate(feat_idxs) if self.feature_types[feat] == "categorical"]
+        numerical = [i for i, feat in enumerate(feat_idxs) if self.feature_types[feat] != "categorical"]
+
+        # Os atributos numéricos são avaliados em paralelo (threads) nos nós grandes;
+        # os categóricos são todos avaliados de uma vez pelo bincount
+        def numerical_split(i):
+            feat = feat_idxs[i]
+            rows = sorted_rows[feat]             # A coluna já está ordenada
+            column = self._X[rows, feat]
+            if np.any(column[1:] == column[:-1]):
+                # Com valores repetidos, os candidatos dependem da ordem dos empates: ordena o nó como a versão original
+                # (linhas por ordem crescente, argsort por omissão), para os thresholds serem os mesmos
+                rows = np.sort(idxs)
+                rows = rows[np.argsort(self._X[rows, feat])]
+                column = self._X[rows, feat]
+            return self.sorted_entropy_split(column, self._y_codes[rows], self._n_classes)
+
+        if self._thread_pool is not None and len(numerical) > 1 and len(idxs) >= PARALLEL_MIN_SAMPLES:
+            numerical_results = self._thread_pool.map(numerical_split, numerical)
         else:
-            return best_feat, best_split, best_gain, self.split_numerical(X[:, best_feat], best_split)
+            numerical_results = map(numerical_split, numerical)
+
+        if categorical:
+            cat_feats = [feat_idxs[i] for i in categorical]
+            gains[categorical] = self.categorical_gains(idxs, parent_entropy, cat_feats)
+
+        for i, (threshold, entropy_value) in zip(numerical, numerical_results):
+            if threshold is not None:
+                gains[i] = parent_entropy - entropy_value
+                thresholds[feat_idxs[i]] = threshold
+
+        # O primeiro atributo com o maior ganho, como na comparação estrita gain > best_gain
+        best = int(np.argmax(gains))
+        best_feat, best_gain = feat_idxs[best], gains[best]
+        #print(f"Melhor split: atributo={best_feat}, ganho={best_gain:.4f}")
+        return best_feat, thresholds.get(best_feat), best_gain
+
+    def contingency_tables(self, idxs, feats):
+        '''Constrói, para cada atributo categórico em feats, a tabela (valor x classe) com o nº de exemplos do nó.
+        Um único bincount sobre as células pré-calculadas; devolve um array (atributos x valores x classes)'''
+        n_cat = len(self._cat_feats)
+        table = np.bincount(self._cells[idxs].ravel(), minlength=n_cat * self._n_values * self._n_classes)
+        table = table.reshape(n_cat, self._n_values, self._n_classes)
+        return table[[self._cat_position[feat] for feat in feats]]
+
+    def categorical_gains(self, idxs, parent_entropy, feats):
+        '''Ganho de informação do split categórico de cada atributo, calculado a partir das tabelas de contingência'''
+        return self.gains_from_tables(self.contingency_tables(idxs, feats), len(idxs), parent_entropy)
+
+    def gains_from_tables(self, table, n, parent_entropy):
+        '''Ganho de informação de cada atributo a partir da sua tabela (valor x classe) com n exemplos'''
+        branch_sizes = table.sum(axis=2)                       # Nº de exemplos em cada ramo
+        branch_entropy = self.entropy_from_counts(table)       # Entropia de cada ramo (0 se o ramo está vazio)
+        weighted_child_entropy = ((branch_sizes / n) * branch_entropy).sum(axis=1)
+        return parent_entropy - weighted_child_entropy
+
+    def label_from_counts(self, class_counts, idxs):
+        '''Classe mais frequente a partir das contagens por classe.
+        Em caso de empate fica, como no Counter, a classe que aparece primeiro nos dados (menor linha)'''
+        tied = np.flatnonzero(class_counts == class_counts.max())
+        if len(tied) > 1:
+            node_y = self._y_codes[idxs]
+            first_rows = [idxs[node_y == code].min() for code in tied]
+            return self.classes_[tied[int(np.argmin(first_rows))]]
+        return self.classes_[tied[0]]
 
     def is_categorical(self, column):
         '''Verifica se a coluna é categórica'''
@@ -177,52 +960,73 @@ class DecisionTree:
         entropy_value = -np.sum(probabilities * np.log2(probabilities))    # Calcula a entropia usando a fórmula
         return entropy_value
 
+    def entropy_from_counts(self, counts):
+        '''Calcula a entropia de cada linha de uma tabela de contagens por classe (uma linha por subconjunto).
+        Usa a mesma fórmula que entropy(); um subconjunto vazio tem entropia 0'''
+        counts = np.asarray(counts, dtype=float)
+        totals = counts.sum(axis=-1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            probabilities = counts / totals
+            terms = np.where(counts > 0, probabilities * np.log2(np.where(counts > 0, probabilities, 1)), 0.0)
+        return -terms.sum(axis=-1)
+
     def conditional_entropy_split(self, X_column, y):
-        '''Encontra o melhor threshold para dividir X_column minimizando H(Class|Split)'''
+        '''Encontra o melhor threshold para dividir X_column minimizando H(Class|Split).
+        Ordena a coluna uma vez e avalia todos os thresholds com contagens acumuladas por classe, em O(n log n)'''
         sorted_indices = np.argsort(X_column)
-        X_sorted = X_column[sorted_indices]
-        y_sorted = y[sorted_indices]
-
-        best_threshold = None
-        best_entropy = float('inf')
-        n = len(y)
+        classes, y_codes = np.unique(y[sorted_indices], return_inverse=True)
+        return self.sorted_entropy_split(X_column[sorted_indices], y_codes, len(classes))
 
-        for i in range(1, n):
-            if y_sorted[i] != y_sorted[i-1]:  # Só considera splits entre classes diferentes
-                threshold = (X_sorted[i] + X_sorted[i-1]) / 2
+    def sorted_entropy_split(self, X_sorted, y_codes_sorted, n_classes):
+        '''Avalia todos os thresholds de uma coluna já ordenada (classes codificadas em 0..n_classes-1) numa só passagem'''
+        n = len(y_codes_sorted)
 
-                left_mask = X_column <= threshold
-                right_mask = X_column > threshold
+        # Só considera splits entre classes diferentes
+        candidates = np.flatnonzero(y_codes_sorted[1:] != y_codes_sorted[:-1]) + 1
+        if len(candidates) == 0:
+            return None, float('inf')
+        thresholds = (X_sorted[candidates] + X_sorted[candidates - 1]) / 2
 
-                left_y = y[left_mask]
-                right_y = y[right_mask]
+        # Nº de exemplos à esquerda (valor <= threshold, incluindo empates) para cada threshold
+        n_left = np.searchsorted(X_sorted, thresholds, side='right')
 
-                left_entropy = self.entropy(left_y)
-                right_entropy = self.entropy(right_y)
-                weighted_entropy = (len(left_y) / n) * left_entropy + (len(right_y) / n) * right_entropy
+        # Contagens acumuladas por classe ao longo da coluna ordenada
+        one_hot = np.zeros((n, n_classes))
+        one_hot[np.arange(n), y_codes_sorted] = 1
+        cumulative = np.cumsum(one_hot, axis=0)
+        left_counts = cumulative[n_left - 1]
+        right_counts = cumulative[-1] - left_counts
 
-                if weighted_entropy < best_entropy:
-                    best_entropy = weighted_entropy
-                    best_threshold = threshold
+        left_entropy = self.entropy_from_counts(left_counts)
+        right_entropy = self.entropy_from_counts(right_counts)
+        weighted_entropy = (n_left / n) * left_entropy + ((n - n_left) / n) * right_entropy
 
-        return best_threshold, best_entropy
+        best = np.argmin(weighted_entropy)    # Em caso de empate fica o primeiro threshold, como no ciclo original
+        return thresholds[best], weighted_entropy[best]
 
     def most_common_label(self, y):
         '''Retorna a classe mais comum num subconjunto'''
         return Counter(y).most_common(1)[0][0]     # garante que a árvore nunca fica sem resposta
 
-    def predict(self, X):
-        '''Aplica a árvore a cada exemplo do conjunto de teste'''
-        predictions = []     # Lista para guardar as previsões de cada exemplo
-        if isinstance(X, pd.DataFrame):  # Forma como itera os exemplos, suporta DataFrames e numpy arrays
-            iterator = X.iterrows()
-        else:
-            iterator = enumerate(X)
+    def predict(self, X, legal_moves=False):
+        '''Aplica a árvore a todos os exemplos do conjunto de teste de uma vez (ver CompiledTree).
+        Com legal_moves=True, X são tabuleiros e a previsão é a coluna legal mais frequente no nó
+        (a prevista, se for legal), sem escolhas aleatórias. Nos modelos sem contagens por nó
+        (convertidos do formato antigo), fica a coluna legal mais perto do centro (ver column_preference)'''
+        if isinstance(X, pd.DataFrame):  # Suporta DataFrames e numpy arrays/listas
+            X = X.values
+        if getattr(self, 'compiled', None) is None:     # Árvores guardadas antes de existir a forma compilada
+            self.compile()
+        if not legal_moves:
+            return self.compiled.predict(self.transform(X))
+        labels = self.compiled.labels
+        return self.compiled.predict(self.transform(X), legal_move_mask(X, labels), column_preference(labels))
 
-        for _, x in iterator:
-            prediction = self.traverse_tree(x, self.root)      # Percorre a árvore para chegar a uma previsão
-            predictions.append(prediction if prediction is not None else self.most_common_class)
-        return np.array(predictions)
+    def transform(self, X):
+        '''Atributos vistos pela árvore: as colunas de X e, com board_features, os atributos derivados do tabuleiro'''
+        if self.board_features:
+            return with_board_features(X)
+        return X
    
     def traverse_tree(self, x, node):
         '''Percorre a árvore a partir da raiz até chegar a um nó folha para fazer uma previsão'''
@@ -237,7 +1041,7 @@ class DecisionTree:
 
         child = node.branches.get(branch)    # Vai buscar o nó filho correspondente ao ramo escolhido
         if child is None:
-            return None            
+            return node.label      # Valor sem ramo: a classe mais frequente neste nó (None se desconhecida)
         return self.traverse_tree(x, child)  # Se encontrou um filho, continua a percorrer a árvore recursivamente
 
     def print_tree(self, feature_names):
@@ -263,12 +1067,18 @@ class DecisionTree:
                     print_node(branch, indent + "    ")
 
         print("Decision Tree:")
-        print_node(self.root)
+        print_node(self.node_tree())
+
+    def node_tree(self):
+        '''Raiz da árvore de objetos Node; um modelo carregado de ficheiro só tem a forma compilada'''
+        if self.root is None and self.compiled is not None:
+            self.root = self.compiled.to_tree()
+        return self.root
 
     def draw_tree(self, feature_names):
         if feature_names is None:
             raise ValueError("Feature names must be provided to draw the tree.")
-        texts, connections = self._plot_tree(self.root, feature_names, x=0)
+        texts, connections = self._plot_tree(self.node_tree(), feature_names, x=0)
         # Dinâmico baseado nos nós
         max_depth = max(-y for (_, y) in [pos for pos, _ in texts]) if texts else 1
         num_nodes = len(texts)
@@ -325,49 +1135,364 @@ class DecisionTree:
                     connections.append((this_pos, (child_x, -(depth + 1) * y_step)))
         return texts, connections
 
-    def save(self):
-        '''Guarda a árvore num ficheiro'''
-        filename = "decision_tree.pkl"
-        with open(filename, 'wb') as f:
-            pickle.dump(self, f)
+    def save(self, filename=MODEL_FILE):
+        '''Guarda a árvore compilada num ficheiro binário versionado:
+            - MODEL_MAGIC, versão (uint32) e tamanho do cabeçalho (uint32)
+            - cabeçalho JSON com os hiperparâmetros, as classes, as tabelas de valores e a posição/dtype/shape de cada array
+            - os arrays da CompiledTree, cada um alinhado a MODEL_ALIGN bytes, para serem lidos com np.memmap
+              (counts só existe nas árvores com contagens; os ficheiros sem ele continuam válidos)'''
+        if self.compiled is None:
+            raise ValueError("A árvore tem de ser treinada antes de ser guardada")
+        compiled = self.compiled
+        names = [name for name in CompiledTree.ARRAYS if getattr(compiled, name) is not None]
+        arrays, position = {}, 0
+        for name in names:
+            array = getattr(compiled, name)
+            arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': position}
+            position += -(-array.nbytes // MODEL_ALIGN) * MODEL_ALIGN
+        header = json.dumps({
+            'arrays': arrays,
+            'labels': compiled.labels.tolist(),
+            'default': int(compiled.default),
+            'values': {str(feat): table.tolist() for feat, table in compiled.values.items()},
+            'feature_types': self.feature_types,
+            'max_depth': self.max_depth,
+            'min_samples_split': self.min_samples_split,
+            'board_features': self.board_features,
+        }).encode('utf-8')
+
+        # Escreve num ficheiro temporário e só depois substitui o modelo: os processos que têm o ficheiro antigo
+        # mapeado em memória (ver load), incluindo esta árvore se foi carregada dele, continuam a lê-lo intacto
+        data_start = self._model_data_start(len(header))
+        temp_path = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(MODEL_MAGIC + struct.pack('<II', MODEL_VERSION, len(header)) + header)
+                for name in names:
+                    f.seek(data_start + arrays[name]['offset'])
+                    f.write(np.ascontiguousarray(getattr(compiled, name)).tobytes())
+                f.truncate(data_start + position)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, filename)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
         print(f"Árvore guardada em '{filename}'.")
-    
-    def load(self):
-        '''Carrega a árvore de um ficheiro'''
-        filename = "decision_tree.pkl"
+
+    @staticmethod
+    def _model_data_start(header_size):
+        '''Posição do primeiro array no ficheiro, depois do cabeçalho'''
+        return -(-(len(MODEL_MAGIC) + 8 + header_size) // MODEL_ALIGN) * MODEL_ALIGN
+
+    def load(self, filename=MODEL_FILE):
+        '''Carrega uma árvore de um ficheiro e devolve-a. Os arrays são mapeados em memória (só de leitura),
+        por isso carregar é quase instantâneo e vários processos partilham as mesmas páginas.
+        Ficheiros .pkl do formato antigo continuam a ser aceites.
+        Lança FileNotFoundError se o ficheiro não existe e ValueError se o formato não é reconhecido'''
+        with open(filename, 'rb') as f:
+            prefix = f.read(len(MODEL_MAGIC) + 8)
+            if not prefix.startswith(MODEL_MAGIC):
+                if filename.endswith('.pkl'):
+                    return self._load_pickle(filename)
+                raise ValueError(f"'{filename}' não é um modelo de árvore de decisão")
+            version, header_size = struct.unpack('<II', prefix[len(MODEL_MAGIC):])
+            if version != MODEL_VERSION:
+                raise ValueError(f"Versão {version} do modelo em '{filename}' não é suportada (esperada {MODEL_VERSION})")
+            header = json.loads(f.read(header_size).decode('utf-8'))
+
+        data_start = self._model_data_start(header_size)
+        arrays = {}
+        for name in CompiledTree.ARRAYS:
+            spec = header['arrays'].get(name)
+            if spec is None:
+                continue        # Array opcional (counts) em falta
+            shape, dtype = tuple(spec['shape']), np.dtype(spec['dtype'])
+            if 0 in shape:
+                arrays[name] = np.empty(shape, dtype=dtype)     # Não é possível mapear 0 bytes
+            else:
+                arrays[name] = np.memmap(filename, dtype=dtype, mode='r', offset=data_start + spec['offset'], shape=shape)
+        labels = np.array(header['labels'])
+        values = {int(feat): np.array(table) for feat, table in header['values'].items()}
+
+        tree = DecisionTree(min_samples_split=header['min_samples_split'], max_depth=header['max_depth'],
+                            board_features=header.get('board_features', False))
+        tree.feature_types = header['feature_types']
+        tree.compiled = CompiledTree(labels=labels, values=values, default=header['default'], **arrays)
+        tree.most_common_class = labels[header['default']]
+        print(f"Árvore carregada de '{filename}'.")
+        return tree
+
+    def _load_pickle(self, filename):
+        '''Carrega uma árvore guardada com pickle (formato antigo)'''
+        with open(filename, 'rb') as f:
+            loaded = pickle.load(f)
+        if not isinstance(loaded, DecisionTree):
+            raise ValueError(f"'{filename}' não contém uma árvore de decisão")
+        tree = DecisionTree()
+        tree.__dict__.update(vars(loaded))       # Atributos que não existiam quando a árvore foi guardada ficam com o valor por omissão
+        # O mesmo nos nós: os slots acrescentados depois (counts, label) não existem nos nós guardados no formato antigo
+        nodes = [tree.root] if tree.root is not None else []
+        for node in nodes:
+            for slot in Node.__slots__:
+                if not hasattr(node, slot):
+                    setattr(node, slot, None)
+            nodes.extend(node.branches.values())
+        tree.compile()
+        print(f"Árvore carregada de '{filename}' (formato antigo).")
+        return tree
+
+
+class SharedArrays:
+    '''Copia arrays numpy para memória partilhada, para os processos de um pool os lerem sem receberem cópias em pickle.
+    spec descreve os blocos e é passado aos processos, que o usam com attach_shared_arrays.
+    Usar com "with": a memória é libertada no fim'''
+    def __init__(self, arrays):
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            self.blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+
+_worker_blocks = []
+
+
+def attach_shared_arrays(spec):
+    '''Nos processos do pool: liga-se aos blocos descritos por SharedArrays.spec e devolve {nome: array}'''
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)        # Mantém a memória ligada enquanto o processo existir
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays
+
+
+class SharedTrainingData(SharedArrays):
+    '''Copia os arrays de treino de uma DecisionTree para memória partilhada (ver SharedArrays);
+    attributes tem os restantes atributos de que os processos precisam para crescer subárvores'''
+    ARRAYS = ('_y_codes', '_codes', '_cells', '_X')
+    ATTRIBUTES = ('min_samples_split', 'max_depth', 'feature_types', 'classes_', '_n_classes',
+                  '_cat_feats', '_cat_position', '_feature_values', '_n_values', '_n_split_feats', 'profile')
+
+    def __init__(self, tree):
+        # Só os atributos numéricos leem X diretamente
+        super().__init__({attr: getattr(tree, attr) for attr in self.ARRAYS
+                          if attr != '_X' or "numerical" in tree.feature_types})
+        self.attributes = {attr: getattr(tree, attr) for attr in self.ATTRIBUTES}
+
+
+_worker_tree = None
+
+
+def _attach_training_data(spec, attributes):
+    '''Inicializador dos processos do pool: liga-se à memória partilhada e prepara uma árvore para crescer subárvores'''
+    global _worker_tree
+    tree = DecisionTree()
+    for attr, value in attributes.items():
+        setattr(tree, attr, value)
+    for attr, array in attach_shared_arrays(spec).items():
+        setattr(tree, attr, array)
+    tree._row_mask = np.zeros(len(tree._y_codes), dtype=bool)
+    _worker_tree = tree
+
+
+def _fit_tree(params, X, y):
+    '''Tarefa do pool do grid_search: treina uma árvore com os parâmetros dados'''
+    tree = DecisionTree(**params)
+    tree.fit(X, y)
+    return tree
+
+
+def _grow_subtree(idxs, depth, n_feats, used_features_count, sorted_rows, seed):
+    '''Tarefa do pool: cresce a subárvore com as linhas idxs e devolve (nó raiz, registo dos nós se profile=True)'''
+    _worker_tree._rng = np.random.default_rng(seed)
+    _worker_tree.node_profile = [] if _worker_tree.profile else None
+    return _worker_tree.grow_tree(idxs, depth, n_feats, used_features_count, sorted_rows), _worker_tree.node_profile
+
+
+def hash_split(rows, test_size, seed=42):
+    '''Divisão treino/teste determinística por linha: a linha de índice r é de teste se o hash (splitmix64) de
+    (seed, r) cair abaixo de test_size. Não precisa de ver o dataset inteiro, e as linhas acrescentadas a um
+    dataset não mudam a divisão das anteriores. Devolve a máscara booleana das linhas de teste'''
+    x = np.asarray(rows, dtype=np.uint64) + np.uint64(seed * 0x9E3779B97F4A7C15 % (1 << 64))
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53) < test_size
+
+
+def read_csv_chunks(filename, chunksize=STREAM_CHUNKSIZE, test_size=0.0, split_seed=42, subset='train'):
+    '''Lê o CSV por blocos de chunksize linhas; devolve (X, y) de cada bloco, com a última coluna como classe.
+    Com test_size > 0 devolve só as linhas de subset ('train' ou 'test') da divisão de hash_split'''
+    if subset not in ('train', 'test'):
+        raise ValueError("subset deve ser 'train' ou 'test'")
+    first_row = 0
+    for chunk in pd.read_csv(filename, chunksize=chunksize):
+        X, y = chunk.iloc[:, :-1].values, chunk.iloc[:, -1].values
+        if test_size > 0:
+            keep = hash_split(np.arange(first_row, first_row + len(y)), test_size, split_seed)
+            if subset == 'train':
+                keep = ~keep
+            X, y = X[keep], y[keep]
+        first_row += len(chunk)
+        yield X, y
+
+
+_model_registry = {}        # Modelos já treinados/carregados neste processo, por chave da cache
+_dataset_hashes = {}        # (ficheiro, mtime, tamanho) -> sha256 do conteúdo, para não reler o dataset
+
+
+def dataset_hash(filename):
+    '''sha256 do conteúdo do dataset (só é recalculado se o ficheiro mudar)'''
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    if key not in _dataset_hashes:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _dataset_hashes[key] = digest.hexdigest()
+    return _dataset_hashes[key]
+
+
+def train_cached(filename, test_size=0.2, split_seed=42, cache_dir=MODEL_CACHE_DIR, model_class=None, stream=False,
+                 **tree_params):
+    '''Devolve uma árvore (ou outro modelo, model_class) treinada com (1 - test_size) do dataset, reutilizando modelos já treinados.
+    A chave da cache junta o sha256 do dataset, os hiperparâmetros e as versões do modelo, por isso só se volta a treinar quando um deles muda.
+    Procura primeiro no registo em memória do processo, depois em cache_dir, e só então treina.
+    Com stream=True a árvore é treinada por blocos (fit_stream), sem carregar o dataset, e as linhas de treino
+    vêm da divisão por hash das linhas (hash_split) em vez do train_test_split'''
+    model_class = model_class or DecisionTree
+    if stream and not hasattr(model_class, 'fit_stream'):
+        raise ValueError(f"{model_class.__name__} não suporta treino por blocos")
+    params = {'test_size': test_size, 'split_seed': split_seed, 'format': MODEL_VERSION, 'content': MODEL_CONTENT_VERSION,
+              'model': model_class.__name__, **tree_params}
+    if stream:
+        params['split'] = 'hash'         # Linhas de treino diferentes das do train_test_split: outro modelo
+    key = hashlib.sha256((dataset_hash(filename) + json.dumps(params, sort_keys=True)).encode()).hexdigest()[:32]
+    if key in _model_registry:
+        return _model_registry[key]
+
+    path = os.path.join(cache_dir, f"{key}{model_class.MODEL_EXTENSION}")
+    tree = None
+    if os.path.exists(path):
         try:
-            with open(filename, 'rb') as f:
-                tree = pickle.load(f)
-            print(f"Árvore carregada de '{filename}'.")
-            return tree
-        except FileNotFoundError:
-            print(f"Erro: Ficheiro '{filename}' não encontrado. Execute primeiro 'decision_tree.py'.")
-            exit()
-            
-        
-class DecisionTree_Player:
-    def __init__(self, random = True):
-        '''Constrói um jogador a partir de uma árvore de decisão'''
-        if not random:
-            temp_tree = DecisionTree()
-            self.tree = temp_tree.load()  # Usa o return do método `load`
+            tree = model_class().load(path)
+        except (OSError, ValueError) as error:
+            print(f"Modelo em cache inválido ({error}). A treinar de novo.")
+
+    if tree is None:
+        tree = model_class(**tree_params)
+        if stream:
+            print(f"a treinar a árvore por blocos com {1 - test_size} do dataset")
+            tree.fit_stream(filename, test_size=test_size, split_seed=split_seed)
         else:
-            self.tree = DecisionTree()
-            filename = "dataset_quatro_em_linha_mcts.csv"
             df = pd.read_csv(filename)
             X = df.iloc[:, :-1].values  # Todas as colunas exceto a última
             y = df.iloc[:, -1].values  # Última coluna
-            size = 0.2
-            X_sample, _, y_sample, _ = train_test_split(X, y, test_size=size, random_state=42)
-            print(f"a treinar a árvore com {1 - size} do dataset")
-            self.tree.fit(X_sample, y_sample)
+            X_sample, _, y_sample, _ = train_test_split(X, y, test_size=test_size, random_state=split_seed)
+            print(f"a treinar a árvore com {1 - test_size} do dataset")
+            tree.fit(X_sample, y_sample)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            tree.save(temp_path)
+            os.replace(temp_path, path)     # Outro processo nunca vê um ficheiro escrito a meio
+        except OSError as error:
+            print(f"Não foi possível guardar o modelo em cache: {error}")
+
+    _model_registry[key] = tree
+    return tree
+
+
+def load_model(path):
+    '''Carrega uma árvore (ficheiro) ou uma floresta (pasta criada por RandomForest.save)'''
+    if os.path.isdir(path):
+        from randomforest import RandomForest
+        return RandomForest().load(path)
+    return DecisionTree().load(path)
+
+
+def mirror_position(position):
+    '''Espelho de um tabuleiro achatado (colunas invertidas), como tuplo'''
+    return tuple(cell for r in range(BOARD_ROWS)
+                 for cell in reversed(position[r * BOARD_COLS:(r + 1) * BOARD_COLS]))
+
+
+def canonical_position(state):
+    '''Chave canónica de um tabuleiro achatado: a menor entre a posição e o seu espelho (colunas invertidas).
+    Devolve (chave, espelhado), em que espelhado indica se a posição pedida é o espelho da chave'''
+    position = tuple(state)
+    mirror = mirror_position(position)
+    if mirror < position:
+        return mirror, True
+    return position, False
+
+
+class DecisionTree_Player:
+    def __init__(self, random = True, model_path=MODEL_FILE, cache_size=PREDICTION_CACHE_SIZE, n_estimators=1,
+                 board_features=False, stream=None):
+        '''Constrói um jogador a partir de uma árvore de decisão.
+        Com random=False usa o modelo guardado em model_path; se não for possível carregá-lo, treina uma árvore nova.
+        Lança FileNotFoundError se for preciso treinar e o dataset de treino (TRAINING_DATASET) não existir.
+        Com n_estimators > 1 treina uma floresta aleatória (RandomForest) em vez de uma única árvore.
+        Com board_features=True a árvore treinada usa também os atributos derivados do tabuleiro (ver boardfeatures.py),
+        e fica limitada a BOARD_FEATURES_MAX_DEPTH níveis, com uma accuracy próxima da árvore sem limite.
+        stream: treina a árvore por blocos (fit_stream), sem carregar o dataset em memória. Por omissão (None) só
+        o faz quando o dataset tem mais de STREAM_MIN_BYTES; a floresta é sempre treinada em memória'''
+        if not random:
+            try:
+                self.tree = load_model(model_path)  # Usa o return do método `load`
+            except (OSError, ValueError) as error:
+                if not os.path.isfile(TRAINING_DATASET):
+                    raise FileNotFoundError(f"Não foi possível carregar o modelo '{model_path}' ({error}) "
+                                            f"nem treinar um novo: o dataset '{TRAINING_DATASET}' não existe") from error
+                print(f"Erro ao carregar o modelo: {error}. A treinar uma árvore nova.")
+                random = True
+        if random:
+            # Só treina se o dataset ou os hiperparâmetros mudaram desde o último treino (ver train_cached)
+            if n_estimators > 1:
+                from randomforest import RandomForest
+                self.tree = train_cached(TRAINING_DATASET, test_size=0.2, split_seed=42,
+                                         model_class=RandomForest, n_estimators=n_estimators, n_jobs=-1)
+            else:
+                tree_params = {'board_features': True, 'max_depth': BOARD_FEATURES_MAX_DEPTH} if board_features else {}
+                if stream is None:
+                    stream = os.path.getsize(TRAINING_DATASET) > STREAM_MIN_BYTES
+                self.tree = train_cached(TRAINING_DATASET, test_size=0.2, split_seed=42, stream=stream, **tree_params)
             print("Árvore treinada com dados aleatórios.")
+        # Cache LRU das previsões, por posição canónica (ver canonical_position)
+        self._predict_position = functools.lru_cache(maxsize=cache_size)(self._predict_canonical)
+
+    def _predict_canonical(self, position):
+        '''Previsões da árvore para uma posição canónica e para o seu espelho, restritas às colunas que não estão cheias.
+        As duas orientações são avaliadas numa só chamada, porque a árvore não foi treinada para dar jogadas simétricas'''
+        return tuple(self.tree.predict([position, mirror_position(position)], legal_moves=True).tolist())
+
+    def cache_info(self):
+        '''Acertos, falhas e ocupação da cache de previsões'''
+        return self._predict_position.cache_info()
 
     def play(self, state, legal_moves):
         '''Faz uma jogada com base no estado atual do jogo'''
-        prediction = self.tree.predict([state])
+        # Uma posição e o seu espelho partilham a entrada da cache, que guarda a previsão de cada orientação:
+        # a jogada é sempre a que a árvore prevê para a posição pedida
+        position, mirrored = canonical_position(state)
+        prediction = self._predict_position(position)[mirrored]
         print(f"Jogada prevista: {prediction}")
-        if prediction is not None and prediction[0] in legal_moves:
-            return prediction[0]
+        if prediction in legal_moves:
+            return prediction
         else:
-            return random.choice(legal_moves)  # Se a previsão não for válida, escolhe aleatoriamente entre as jogadas válidas
\ No newline at end of file
+            return random.choice(legal_moves)  # Só acontece se nenhuma coluna legal for uma classe do modelo
\ No newline at end of file
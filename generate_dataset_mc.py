@@ -1,6 +1,9 @@
 # generate_dataset_mc.py
 
+import argparse
 import csv
+import io
+import json
 import os
 import random
 import time
@@ -10,6 +13,7 @@ import copy
 import multiprocessing
 import math
 from montecarlo import MonteCarlo_Player, MonteCarloNode
+from hoeffdingtree import HoeffdingTree
 from board import Board
 from variables import *
 
@@ -24,19 +28,26 @@ def flatten_board(board):
             flat.append(grid[r][c])
     return flat
 
-def jogador_aleatorio(board):
+def jogador_aleatorio(board, rng=random):
     valid_moves = get_valid_moves(board)
-    return random.choice(valid_moves) if valid_moves else -1
+    return rng.choice(valid_moves) if valid_moves else -1
+
+def semente_do_jogo(base_seed, game_id):
+    '''Semente de um jogo: depende só da semente base da execução e do game_id, por isso o jogo é reprodutível'''
+    return int(np.random.SeedSequence([base_seed, game_id]).generate_state(1)[0])
 
 def simular_jogo_e_coletar_dados(args):
     """
     Simula UM jogo completo e retorna uma lista de linhas de dados (estado, melhor_jogada).
     Recebe as *configurações* (strings de dificuldade) e instancia os jogadores aqui.
     """
-    modo_jogo, p1_setting, p2_setting, game_id = args
+    modo_jogo, p1_setting, p2_setting, game_id, seed = args
 
     board = Board()
     dados_jogo = []  # Armazena as linhas (estado, jogada) deste jogo
+    # Com semente, as escolhas aleatórias e as procuras MCTS de cada jogador são reprodutíveis
+    rng = random.Random(seed)
+    seed1, seed2 = (None, None) if seed is None else np.random.SeedSequence(seed).generate_state(2).tolist()
 
     # Força o primeiro movimento de jogador 1 numa coluna cíclica
     coluna_inicial_forcada = game_id % COLS
@@ -48,14 +59,14 @@ def simular_jogo_e_coletar_dados(args):
 
     try:
         if modo_jogo == 'mcts_vs_random':
-            jogador1 = MonteCarlo_Player(difficulty=p1_setting)  # Cria instância aqui
-            jogador2 = jogador_aleatorio
+            jogador1 = MonteCarlo_Player(difficulty=p1_setting, seed=seed1)  # Cria instância aqui
+            jogador2 = lambda b: jogador_aleatorio(b, rng)
         elif modo_jogo == 'mcts_vs_mcts':
-            jogador1 = MonteCarlo_Player(difficulty=p1_setting)  
-            jogador2 = MonteCarlo_Player(difficulty=p2_setting)  
+            jogador1 = MonteCarlo_Player(difficulty=p1_setting, seed=seed1)  
+            jogador2 = MonteCarlo_Player(difficulty=p2_setting, seed=seed2)  
         elif modo_jogo == 'random_vs_mcts':
-            jogador1 = jogador_aleatorio
-            jogador2 = MonteCarlo_Player(difficulty=p2_setting)  
+            jogador1 = lambda b: jogador_aleatorio(b, rng)
+            jogador2 = MonteCarlo_Player(difficulty=p2_setting, seed=seed2)  
         else:
             raise ValueError(f"Modo de jogo inválido: {modo_jogo}")
     except Exception as e:
@@ -90,7 +101,7 @@ def simular_jogo_e_coletar_dados(args):
                     # 4. Definir a jogada a ser feita
                     move = best_move_col
                 elif valid_moves:
-                    move = random.choice(valid_moves)
+                    move = rng.choice(valid_moves)
                 else:
                     break  # Sem jogadas válidas e make_move falhou
 
@@ -98,7 +109,7 @@ def simular_jogo_e_coletar_dados(args):
                 print(
                     f"[Game {game_id}] ERRO durante MCTS make_move (J{current_player_id}, diff='{current_player_obj.difficulty}'): {e}")
                 if valid_moves:
-                    move = random.choice(valid_moves)  # Tenta jogada aleatória se o MCTS falhou
+                    move = rng.choice(valid_moves)  # Tenta jogada aleatória se o MCTS falhou
                 else:
                     break  # Sem jogadas, termina
 
@@ -117,7 +128,116 @@ def simular_jogo_e_coletar_dados(args):
     return dados_jogo
 
 
-def main():
+def custo_estimado(args):
+    '''Custo relativo de um jogo: nº de simulações MCTS por jogada dos dois jogadores (um jogador aleatório conta 1)'''
+    _, p1_setting, p2_setting = args[:3]
+    return sum(MonteCarlo_Player.SIMULATIONS.get(setting, 1) for setting in (p1_setting, p2_setting))
+
+
+def simular_jogo_cronometrado(args):
+    '''Tarefa do pool: simula um jogo e devolve (args, dados do jogo, pid do processo, segundos ocupados, segundos de CPU)'''
+    start, start_cpu = time.perf_counter(), time.process_time()
+    dados_jogo = simular_jogo_e_coletar_dados(args)
+    return args, dados_jogo, os.getpid(), time.perf_counter() - start, time.process_time() - start_cpu
+
+
+def gravar_lote(csvfile, writer, linhas):
+    '''Escreve um lote de linhas no CSV e força a escrita em disco (numa falha perde-se no máximo o lote em curso)'''
+    writer.writerows(linhas)
+    csvfile.flush()
+    os.fsync(csvfile.fileno())
+
+
+def registar(manifest_file, registos):
+    '''Acrescenta registos (uma linha JSON cada) ao manifesto e força a escrita em disco'''
+    for registo in registos:
+        manifest_file.write(json.dumps(registo) + '\n')
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+
+def ler_manifesto(path):
+    '''Lê o manifesto: devolve (execuções, {game_id: registo do jogo concluído}, tamanho do CSV no último registo).
+    O tamanho é None se nenhum registo o tiver (manifestos antigos). Uma última linha incompleta (escrita interrompida) é ignorada'''
+    execucoes, concluidos, csv_offset = [], {}, None
+    if not os.path.isfile(path):
+        return execucoes, concluidos, csv_offset
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                registo = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'run' in registo:
+                execucoes.append(registo)
+            else:
+                concluidos[registo['game_id']] = registo
+            csv_offset = registo.get('csv_offset', csv_offset)
+    return execucoes, concluidos, csv_offset
+
+
+def descartar_lote_incompleto(path, csv_offset):
+    '''Corta o CSV no tamanho registado no manifesto: as linhas a seguir são de um lote interrompido
+    antes de chegar ao manifesto, e os seus jogos vão ser gerados de novo'''
+    if csv_offset is None or not os.path.isfile(path):
+        return
+    size = os.path.getsize(path)
+    if size > csv_offset:
+        with open(path, 'r+b') as f:
+            f.truncate(csv_offset)
+            os.fsync(f.fileno())
+        print(f"Descartados {size - csv_offset} bytes de um lote que não chegou ao manifesto.")
+    elif size < csv_offset:
+        print(f"Aviso: '{path}' tem {size} bytes, menos do que os {csv_offset} registados no manifesto.")
+
+
+def ler_estados(path, inicio, fim):
+    '''Linhas (estado, jogada) do CSV entre as posições inicio e fim (em bytes), como array de inteiros.
+    A partir do início do ficheiro, o cabeçalho é ignorado'''
+    with open(path, 'rb') as f:
+        f.seek(inicio)
+        texto = f.read(fim - inicio).decode('utf-8')
+    linhas = list(csv.reader(io.StringIO(texto)))[1 if inicio == 0 else 0:]
+    return np.array(linhas, dtype=np.int64).reshape(-1, ROWS * COLS + 1)
+
+
+def planear_jogos(modo, matchups, num_jogos, primeiro_id, base_seed):
+    '''Lista de tarefas (modo, settings P1, settings P2, game_id, semente) de uma execução.
+    Os game_id são consecutivos a partir de primeiro_id e a semente de cada jogo é derivada do seu game_id'''
+    tasks_args = []
+    num_matchups = len(matchups)
+    games_per_matchup = num_jogos // num_matchups
+    extra_games = num_jogos % num_matchups
+    game_id_counter = primeiro_id - 1
+
+    for i, matchup_settings in enumerate(matchups):
+        num_jogos_neste_matchup = games_per_matchup + (1 if i < extra_games else 0)
+        if num_jogos_neste_matchup == 0: continue
+
+        # Extrai as settings (strings de dificuldade) para P1 e P2
+        p1_setting, p2_setting = None, None
+        if modo == 'mcts_vs_mcts':
+            p1_setting, p2_setting = matchup_settings  # Espera tuple ('diff1', 'diff2')
+        elif modo == 'mcts_vs_random':
+            p1_setting = matchup_settings[0]  # Espera ('diff1',) ou apenas 'diff1'
+            p2_setting = None  # Random não tem setting
+        elif modo == 'random_vs_mcts':
+            p1_setting = None  # Random não tem setting
+            p2_setting = matchup_settings[0]  # Espera ('diff2',) ou apenas 'diff2'
+
+        # Validação básica das settings (não nulas quando esperado)
+        if (modo != 'random_vs_mcts' and p1_setting is None) or \
+                (modo != 'mcts_vs_random' and p2_setting is None and modo != 'mcts_vs_mcts'):
+            continue
+
+        for _ in range(num_jogos_neste_matchup):
+            game_id_counter += 1
+            # Passa as strings de dificuldade (ou None) para o worker
+            tasks_args.append((modo, p1_setting, p2_setting, game_id_counter, semente_do_jogo(base_seed, game_id_counter)))
+    return tasks_args
+
+
+def main(resume=False):
     NUM_GAMES_ESTA_EXECUCAO = 1000  # Jogos a gerar nesta execução
 
     # Define os matchups usando apenas as strings de dificuldade que MonteCarlo_Player entende
@@ -136,7 +256,14 @@ def main():
     MODE = 'mcts_vs_mcts'  # Deve ser consistente com os matchups
 
     FILENAME = 'dataset_quatro_em_linha_mcts.csv'  # Nome do dataset cumulativo
+    MANIFEST = os.path.splitext(FILENAME)[0] + '.manifest.jsonl'   # Execuções e jogos já gravados no dataset
+    BASE_SEED = 2024            # Semente base: a semente de cada jogo é derivada desta e do game_id
     NUM_PROCESSOS = 6
+    JOGOS_POR_LOTE = 20         # Jogos acumulados em memória antes de cada escrita (com fsync) no CSV
+
+    # Árvore incremental atualizada com os jogos gerados (None para desligar)
+    ONLINE_STATE = 'hoeffding_tree.pkl'           # Estado da árvore, para continuar o treino na próxima execução
+    ONLINE_MODEL = 'decision_tree_online.dtm'     # Modelo pronto a usar (DecisionTree_Player(random=False, model_path=...))
 
     if not DESIRED_MATCHUPS:
         print("ERRO: A lista DESIRED_MATCHUPS está vazia.")
@@ -145,82 +272,149 @@ def main():
         print("ERRO: NUM_PROCESSOS deve ser pelo menos 1.")
         return
 
-    print(f"Preparando {NUM_GAMES_ESTA_EXECUCAO} jogos para adicionar a '{FILENAME}'...")
-    print(f"Modo: {MODE}")
-    print(f"Matchups a incluir: {DESIRED_MATCHUPS}")
-
     start_time_prep = time.time()
 
-    # Prepara lista de argumentos para as tarefas (passando strings de dificuldade)
-    tasks_args = []
-    num_matchups = len(DESIRED_MATCHUPS)
-    games_per_matchup = NUM_GAMES_ESTA_EXECUCAO // num_matchups
-    extra_games = NUM_GAMES_ESTA_EXECUCAO % num_matchups
-    game_id_counter = 0
-
-    for i, matchup_settings in enumerate(DESIRED_MATCHUPS):
-        num_jogos_neste_matchup = games_per_matchup + (1 if i < extra_games else 0)
-        if num_jogos_neste_matchup == 0: continue
-
-        # Extrai as settings (strings de dificuldade) para P1 e P2
-        p1_setting, p2_setting = None, None
-        if MODE == 'mcts_vs_mcts':
-            p1_setting, p2_setting = matchup_settings  # Espera tuple ('diff1', 'diff2')
-        elif MODE == 'mcts_vs_random':
-            p1_setting = matchup_settings[0]  # Espera ('diff1',) ou apenas 'diff1'
-            p2_setting = None  # Random não tem setting
-        elif MODE == 'random_vs_mcts':
-            p1_setting = None  # Random não tem setting
-            p2_setting = matchup_settings[0]  # Espera ('diff2',) ou apenas 'diff2'
-
-        # Validação básica das settings (não nulas quando esperado)
-        if (MODE != 'random_vs_mcts' and p1_setting is None) or \
-                (MODE != 'mcts_vs_random' and p2_setting is None and MODE != 'mcts_vs_mcts'):
-            continue
+    # Os game_id continuam a numeração das execuções anteriores (não se repetem jogos);
+    # com --resume, a última execução é planeada de novo e os jogos já gravados são ignorados
+    execucoes, concluidos, csv_offset = ler_manifesto(MANIFEST)
+    descartar_lote_incompleto(FILENAME, csv_offset)
+    if resume and execucoes:
+        execucao = execucoes[-1]
+        print(f"A retomar a execução {execucao['run']} ({len(concluidos)} jogos já gravados no manifesto)...")
+    else:
+        if resume:
+            print(f"Nada para retomar em '{MANIFEST}'. A iniciar uma execução nova.")
+        execucao = {'run': len(execucoes) + 1, 'mode': MODE, 'matchups': [list(m) for m in DESIRED_MATCHUPS],
+                    'num_games': NUM_GAMES_ESTA_EXECUCAO, 'seed': BASE_SEED,
+                    'first_game_id': max((e['first_game_id'] + e['num_games'] for e in execucoes), default=1)}
+    matchups = [tuple(m) for m in execucao['matchups']]
+
+    print(f"Preparando {execucao['num_games']} jogos para adicionar a '{FILENAME}'...")
+    print(f"Modo: {execucao['mode']}")
+    print(f"Matchups a incluir: {matchups}")
+    print(f"Jogos {execucao['first_game_id']} a {execucao['first_game_id'] + execucao['num_games'] - 1} (semente base {execucao['seed']})")
 
-        for _ in range(num_jogos_neste_matchup):
-            game_id_counter += 1
-            # Passa as strings de dificuldade (ou None) para o worker
-            tasks_args.append((MODE, p1_setting, p2_setting, game_id_counter))
+    # Prepara lista de argumentos para as tarefas (passando strings de dificuldade)
+    tasks_args = planear_jogos(execucao['mode'], matchups, execucao['num_games'], execucao['first_game_id'], execucao['seed'])
+    tasks_args = [args for args in tasks_args if args[3] not in concluidos]
+
+    # Árvore incremental atualizada lote a lote, com os jogos já gravados (sem voltar a treinar com o dataset inteiro).
+    # O estado guarda até onde (em bytes do CSV) a árvore já aprendeu: se a execução anterior parou entre o manifesto
+    # e o estado, a árvore aprende agora os estados que lhe faltam
+    online_tree = None
+    if ONLINE_STATE:
+        try:
+            online_tree = HoeffdingTree.load_state(ONLINE_STATE)
+        except FileNotFoundError:
+            online_tree = HoeffdingTree()
+        except ValueError as e:
+            print(f"Aviso: {e}. A árvore incremental começa do zero.")
+            online_tree = HoeffdingTree()
+        dataset_size = os.path.getsize(FILENAME) if os.path.isfile(FILENAME) else 0
+        learned = getattr(online_tree, 'source_offset', None)
+        if learned is None:
+            online_tree.source_offset = dataset_size      # Árvore nova: aprende só os jogos gerados daqui em diante
+            online_tree.save_state(ONLINE_STATE, verbose=False)
+        elif learned < dataset_size:
+            rows = ler_estados(FILENAME, learned, dataset_size)
+            print(f"A árvore incremental aprende {len(rows)} estados já gravados que lhe faltavam.")
+            if len(rows):
+                online_tree.partial_fit(rows[:, :-1], rows[:, -1])
+            online_tree.source_offset = dataset_size
+            online_tree.save_state(ONLINE_STATE, verbose=False)
 
     if not tasks_args:
         print("Nenhuma tarefa de simulação foi criada.")
+        if online_tree is not None and online_tree.root is not None:
+            online_tree.save(ONLINE_MODEL)
         return
 
-    # Executa o Pool
+    # Os jogos mais caros (hard vs hard) começam primeiro e cada processo pede um jogo de cada vez (chunksize=1):
+    # quem acaba cedo vai buscar o próximo jogo à fila comum, e no fim só sobram jogos curtos
+    tasks_args.sort(key=custo_estimado, reverse=True)
+
+    # Executa o Pool: os jogos são recebidos pela ordem em que terminam e gravados em lotes,
+    # por isso a memória não cresce com o nº de jogos e uma falha só perde o lote em curso
     print("A iniciar Pool...")
     start_time_pool = time.time()
-    results_list_of_lists = []
+    total_states_recorded = 0
+    jogos_concluidos = 0
+    lote = []
+    jogos_lote = []                  # Registos do manifesto dos jogos do lote em curso
+    ocupacao = defaultdict(float)    # pid -> segundos a simular jogos
+    jogos_por_processo = defaultdict(int)
+    tempo_cpu = 0.0
     try:
-        with multiprocessing.Pool(processes=NUM_PROCESSOS) as pool:
-            results_list_of_lists = pool.map(simular_jogo_e_coletar_dados, tasks_args)
+        file_exists = os.path.isfile(FILENAME)
+        is_empty = not file_exists or os.path.getsize(FILENAME) == 0
+        with open(FILENAME, 'a', newline='', encoding='utf-8') as csvfile, \
+                open(MANIFEST, 'a', encoding='utf-8') as manifest_file, \
+                multiprocessing.Pool(processes=NUM_PROCESSOS) as pool:
+            writer = csv.writer(csvfile)
+            if is_empty:
+                header = [f'cell_{r}_{c}' for r in range(ROWS) for c in range(COLS)] + ['best_move_col']
+                gravar_lote(csvfile, writer, [header])
+            if execucao not in execucoes:
+                # O tamanho do CSV é registado no manifesto no início da execução e depois de cada lote
+                registar(manifest_file, [{**execucao, 'csv_offset': os.fstat(csvfile.fileno()).st_size}])
+
+            for args, game_data, pid, busy, cpu in pool.imap_unordered(simular_jogo_cronometrado, tasks_args, chunksize=1):
+                jogos_concluidos += 1
+                modo, p1_setting, p2_setting, game_id, seed = args
+                jogos_lote.append({'game_id': game_id, 'seed': seed, 'mode': modo,
+                                   'matchup': [p1_setting, p2_setting], 'states': len(game_data)})
+                ocupacao[pid] += busy
+                tempo_cpu += cpu
+                jogos_por_processo[pid] += 1
+                lote.extend(game_data)
+
+                if jogos_concluidos % JOGOS_POR_LOTE == 0 or jogos_concluidos == len(tasks_args):
+                    # O manifesto só é escrito depois do CSV: um jogo no manifesto está sempre no dataset,
+                    # e o que estiver no CSV depois do último csv_offset é descartado na próxima execução
+                    gravar_lote(csvfile, writer, lote)
+                    csv_offset = os.fstat(csvfile.fileno()).st_size
+                    registar(manifest_file, [{**registo, 'csv_offset': csv_offset} for registo in jogos_lote])
+                    # A árvore só aprende jogos já gravados, e o seu estado é guardado com cada lote:
+                    # uma interrupção nunca deixa na árvore jogos que --resume vai repetir
+                    if online_tree is not None and lote:
+                        lote_rows = np.array(lote)
+                        online_tree.partial_fit(lote_rows[:, :-1], lote_rows[:, -1])
+                    if online_tree is not None:
+                        online_tree.source_offset = csv_offset
+                        online_tree.save_state(ONLINE_STATE, verbose=False)
+                    total_states_recorded += len(lote)
+                    lote, jogos_lote = [], []
+                    elapsed = time.time() - start_time_pool
+                    print(f"[{jogos_concluidos}/{len(tasks_args)} jogos] {total_states_recorded} estados gravados | "
+                          f"{jogos_concluidos / elapsed:.2f} jogos/s | {total_states_recorded / elapsed:.1f} estados/s")
+            # Fecho normal dos processos: o pygame.init() de variables.py instala no SDL um handler de SIGTERM,
+            # por isso o terminate() feito à saída do "with" pode ficar à espera de processos que não terminam
+            pool.close()
+            pool.join()
+    except IOError as e:
+        print(f"ERRO ao escrever/anexar em {FILENAME}: {e}")
     except Exception as e:
         print(f"\nERRO durante execução do Pool: {e}")
-
+    finally:
+        # O estado já foi guardado com o último lote gravado; falta o modelo pronto a usar
+        if online_tree is not None and online_tree.root is not None:
+            online_tree.save(ONLINE_MODEL)
+            print(f"Árvore incremental: {online_tree.n_seen} exemplos, {online_tree.node_count()} nós.")
+
+    # Utilização de cada processo: tempo a simular / tempo do pool. Com a fila por custo, o tempo do pool
+    # deve ficar perto do tempo de CPU total a dividir pelo nº de processos (com pelo menos um CPU por processo)
     pool_time = time.time() - start_time_pool
-
-    # Coleta e escreve resultados
-    all_rows_data = [row for game_data in results_list_of_lists if game_data for row in game_data]
-    total_states_recorded = len(all_rows_data)
-
-    if not all_rows_data:
+    if ocupacao:
+        for i, pid in enumerate(sorted(ocupacao)):
+            print(f"Processo {i + 1} (pid {pid}): {jogos_por_processo[pid]} jogos, "
+                  f"{ocupacao[pid]:.1f}s ocupado ({100 * ocupacao[pid] / pool_time:.0f}%)")
+        ideal = tempo_cpu / min(NUM_PROCESSOS, os.cpu_count() or 1)
+        print(f"Tempo do pool: {pool_time:.1f}s | CPU: {tempo_cpu:.1f}s | ideal: {ideal:.1f}s (eficiência {100 * ideal / pool_time:.0f}%)")
+
+    if not total_states_recorded:
         print("Nenhum dado gerado nesta execução.")
     else:
         print(f"Adicionados {total_states_recorded} novos estados.")
-        file_exists = os.path.isfile(FILENAME)
-        is_empty = not file_exists or os.path.getsize(FILENAME) == 0
-
-        try:
-            with open(FILENAME, 'a', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                if is_empty:
-                    header = [f'cell_{r}_{c}' for r in range(ROWS) for c in range(COLS)] + ['best_move_col']
-                    writer.writerow(header)
-                writer.writerows(all_rows_data)
-        except IOError as e:
-            print(f"ERRO ao escrever/anexar em {FILENAME}: {e}")
-        except Exception as e:
-            print(f"ERRO durante a escrita no CSV: {e}")
 
     end_time_total = time.time()
     print("-" * 30)
@@ -244,4 +438,7 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"Aviso: Erro ao testar instanciação de MonteCarlo_Player: {e}")
 
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Gera jogos MCTS e acrescenta os estados ao dataset")
+    parser.add_argument('--resume', action='store_true',
+                        help="retoma a última execução do manifesto, saltando os jogos já gravados")
+    main(resume=parser.parse_args().resume)
\ No newline at end of file
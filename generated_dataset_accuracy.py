@@ -5,13 +5,51 @@
 # - 1 = peça do jogador 1
 # - 2 = peça do jogador 2
 
-from decisiontree import DecisionTree
+import argparse
+from decisiontree import DecisionTree, read_csv_chunks
+from randomforest import RandomForest
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import numpy as np
 import pandas as pd
+import time
+
+
+def predict_latency(model, X, repeats=20):
+    '''Tempo médio, em segundos, para prever todos os exemplos de X'''
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict(X)
+    return (time.perf_counter() - start) / repeats
+
+
+def stream_accuracy(filename, max_depth=12, test_size=0.2, split_seed=42):
+    '''Treina e avalia a árvore lendo o dataset por blocos, sem o carregar em memória.
+    A divisão treino/teste é a divisão por hash das linhas (ver decisiontree.hash_split)'''
+    tree = DecisionTree(max_depth=max_depth)
+    tree.fit_stream(filename, test_size=test_size, split_seed=split_seed)
+    correct = n_train = n_test = 0
+    for X, y in read_csv_chunks(filename, test_size=test_size, split_seed=split_seed, subset='test'):
+        correct += int(np.sum(tree.predict(X) == y))
+        n_test += len(y)
+    for _, y in read_csv_chunks(filename, test_size=test_size, split_seed=split_seed, subset='train'):
+        n_train += len(y)
+    print(f"Accuracy no conjunto de teste: {correct / max(n_test, 1):.2f}")
+    print(f"Nº de amostras de treino: {n_train}")
+    print(f"Nº de amostras de teste: {n_test}")
+    print(f"Treino por blocos: {tree.fit_time:.2f}s")
+    return tree
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy da árvore de decisão no dataset gerado")
+    parser.add_argument('--stream', action='store_true',
+                        help="treina e avalia por blocos, sem carregar o dataset (só a árvore principal)")
+    args = parser.parse_args()
+    if args.stream:
+        stream_accuracy("dataset_quatro_em_linha_mcts.csv").save()
+        raise SystemExit
+
     # Carregar o dataset
     df = pd.read_csv("dataset_quatro_em_linha_mcts.csv")
 
@@ -37,5 +75,35 @@ if __name__ == "__main__":
     print(f"Nº de amostras de treino: {len(X_train)}")
     print(f"Nº de amostras de teste: {len(X_test)}")
 
+    # Comparar com uma floresta aleatória (árvores treinadas em paralelo)
+    forest = RandomForest(n_estimators=10, max_depth=12, random_state=42, n_jobs=-1)
+    forest.fit(X_train, y_train)
+    forest_accuracy = accuracy_score(y_test, forest.predict(X_test))
+    print(f"Accuracy da floresta ({forest.n_estimators} árvores): {forest_accuracy:.2f}")
+
+    # Poda: uma árvore treinada com 75% do treino é podada com os outros 25% (validação)
+    X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=0.25, random_state=42)
+    pruned = DecisionTree(max_depth=12)
+    pruned.fit(X_fit, y_fit)
+    before = (pruned.node_count(), pruned.model_nbytes(), predict_latency(pruned, X_test),
+              accuracy_score(y_test, pruned.predict(X_test)))
+    alpha = pruned.prune(X_val, y_val, tolerance=0.005)   # Aceita perder até 0.5 pontos de accuracy na validação
+    after = (pruned.node_count(), pruned.model_nbytes(), predict_latency(pruned, X_test),
+             accuracy_score(y_test, pruned.predict(X_test)))
+    print(f"Poda (alpha={alpha}):")
+    print(f"  nós: {before[0]} -> {after[0]}")
+    print(f"  tamanho do modelo: {before[1] / 1024:.0f} KiB -> {after[1] / 1024:.0f} KiB")
+    print(f"  tempo de previsão do conjunto de teste: {before[2] * 1000:.2f} ms -> {after[2] * 1000:.2f} ms")
+    print(f"  accuracy no conjunto de teste: {before[3]:.4f} -> {after[3]:.4f}")
+
+    # Atributos derivados do tabuleiro (alturas, vitórias/bloqueios, três em linha, centro): árvore mais baixa
+    shallow = DecisionTree(max_depth=7, board_features=True)
+    start = time.perf_counter()
+    shallow.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    shallow_accuracy = accuracy_score(y_test, shallow.predict(X_test))
+    print(f"Atributos derivados (max_depth=7): accuracy {shallow_accuracy:.4f}, {shallow.node_count()} nós, "
+          f"treino {fit_time:.2f}s, previsão {predict_latency(shallow, X_test) * 1000:.2f} ms")
+
     # Guardar a árvore treinada
     tree.save()
\ No newline at end of file
@@ -0,0 +1,217 @@
+# hoeffdingtree.py
+
+# Árvore de decisão incremental (Hoeffding tree / VFDT) para atributos categóricos:
+# - cada folha acumula a tabela (atributo, valor, classe) dos exemplos que lá chegam
+# - de grace_period em grace_period exemplos, a folha compara o ganho de informação dos dois melhores atributos;
+#   se a diferença for maior do que o limite de Hoeffding (ou o limite for menor do que tau), a folha é dividida
+# - a árvore nunca é reconstruída: basta ir chamando partial_fit com os novos exemplos (ex.: jogos gerados)
+# Herda da DecisionTree o cálculo do ganho, a forma compilada (predict) e o save/load do modelo.
+
+import math
+import os
+import pickle
+import numpy as np
+from decisiontree import DecisionTree, Node
+
+
+class LeafStatistics:
+    __slots__ = ['table', 'depth', 'pending']
+    def __init__(self, table, depth):
+        '''Estatísticas de uma folha da árvore incremental'''
+        self.table = table           # Tabela (atributo, valor, classe) dos exemplos que chegaram à folha
+        self.depth = depth           # Profundidade da folha
+        self.pending = 0             # Exemplos recebidos desde a última tentativa de divisão
+
+
+class HoeffdingTree(DecisionTree):
+    def __init__(self, delta=1e-2, tau=0.5, grace_period=50, max_depth=100, random_state=None):
+        '''Parâmetros da árvore incremental. Os valores por omissão são permissivos: com os valores clássicos
+        (delta=1e-7, tau=0.05) a árvore mal cresce nos datasets do jogo e fica com accuracy próxima da classe mais comum'''
+        super().__init__(random_state=random_state, max_depth=max_depth)
+        if not 0 < delta < 1:
+            raise ValueError("delta deve estar em ]0, 1[")
+        if grace_period < 1:
+            raise ValueError("grace_period deve ser pelo menos 1")
+        self.delta = delta                  # Probabilidade de escolher o atributo errado numa divisão
+        self.tau = tau                      # Limite abaixo do qual um empate entre atributos é resolvido
+        self.grace_period = grace_period    # Nº de exemplos numa folha entre tentativas de divisão
+        self.classes_ = np.array([])
+        self._class_codes = {}              # Classe -> código
+        self._value_codes = []              # Para cada atributo: valor -> código
+        self._feature_values = {}           # Para cada atributo: array de valores, pela ordem dos códigos
+        self._class_totals = np.zeros(0, dtype=np.int64)   # Nº de exemplos de cada classe
+        self._n_values = 0                  # Nº máximo de valores de um atributo (2ª dimensão das tabelas)
+        self._leaves = {}                   # Folha (Node) -> LeafStatistics
+        self.n_seen = 0                     # Nº de exemplos já recebidos
+        self.source_offset = None           # Posição nos dados de origem até onde a árvore já aprendeu (ex.: bytes do CSV)
+
+    def fit(self, X, y):
+        '''Treina do zero, passando todos os exemplos por partial_fit'''
+        self.__init__(self.delta, self.tau, self.grace_period, self.max_depth, self.random_state)
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X, y):
+        '''Atualiza a árvore com novos exemplos (sem voltar a ver os anteriores)'''
+        X = np.asarray(X)
+        y = np.asarray(y)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if not len(y):
+            return self
+        if self.root is None:
+            self.feature_types = ["categorical"] * X.shape[1]
+            self._value_codes = [{} for _ in range(X.shape[1])]
+        elif X.shape[1] != len(self.feature_types):
+            raise ValueError(f"Esperados {len(self.feature_types)} atributos, recebidos {X.shape[1]}")
+
+        codes, y_codes = self.encode_batch(X, y)
+        self._class_totals += np.bincount(y_codes, minlength=len(self.classes_))
+        self.n_seen += len(y)
+        if self.root is None:
+            self.root = self.new_leaf(0)
+
+        for leaf, rows in self.route_to_leaves(self.root, np.arange(len(y)), X):
+            stats = self._leaves[leaf]
+            table_size = stats.table.size
+            cells = codes[rows] * len(self.classes_) + y_codes[rows, None]
+            cells += np.arange(len(self.feature_types)) * (stats.table.shape[1] * len(self.classes_))
+            stats.table += np.bincount(cells.ravel(), minlength=table_size).reshape(stats.table.shape)
+            # Distribuição herdada do nó pai quando a folha foi criada mais os exemplos recebidos desde então
+            leaf.counts = leaf.counts + np.bincount(y_codes[rows], minlength=len(self.classes_))
+            leaf.value = self.classes_[int(np.argmax(leaf.counts))]
+            stats.pending += len(rows)
+            if stats.pending >= self.grace_period:
+                stats.pending = 0
+                self.attempt_split(leaf, stats)
+
+        self.most_common_class = self.classes_[int(np.argmax(self._class_totals))]
+        self.compile()
+        return self
+
+    def encode_batch(self, X, y):
+        '''Códigos dos valores e das classes; valores/classes novos aumentam as tabelas de todas as folhas'''
+        grew = False
+        codes = np.empty(X.shape, dtype=np.int64)
+        for feat, value_codes in enumerate(self._value_codes):
+            uniques, inverse = np.unique(X[:, feat], return_inverse=True)
+            for value in uniques:
+                if value not in value_codes:
+                    value_codes[value] = len(value_codes)
+                    self._feature_values[feat] = np.append(self._feature_values.get(feat, np.array([], dtype=X.dtype)), value)
+                    grew = True
+            codes[:, feat] = np.array([value_codes[value] for value in uniques])[inverse]
+
+        uniques, inverse = np.unique(y, return_inverse=True)
+        for label in uniques:
+            if label not in self._class_codes:
+                self._class_codes[label] = len(self._class_codes)
+                self.classes_ = np.append(self.classes_, label) if len(self.classes_) else np.array([label])
+                self._class_totals = np.append(self._class_totals, 0)
+                grew = True
+        y_codes = np.array([self._class_codes[label] for label in uniques])[inverse]
+
+        if grew:
+            self._n_values = max(len(v) for v in self._value_codes)
+            shape = (len(self.feature_types), self._n_values, len(self.classes_))
+            for leaf, stats in self._leaves.items():
+                table = np.zeros(shape, dtype=np.int64)
+                table[:, :stats.table.shape[1], :stats.table.shape[2]] = stats.table
+                stats.table = table
+            self.pad_counts(self.root)
+        return codes, y_codes
+
+    def pad_counts(self, node):
+        '''Acrescenta às contagens dos nós as classes novas'''
+        if node is None:
+            return
+        if node.counts is not None and len(node.counts) < len(self.classes_):
+            node.counts = np.append(node.counts, np.zeros(len(self.classes_) - len(node.counts), dtype=np.int64))
+        for child in node.branches.values():
+            self.pad_counts(child)
+
+    def new_leaf(self, depth, counts=None):
+        '''Cria uma folha vazia (com a distribuição de classes herdada, se houver)'''
+        shape = (len(self.feature_types), self._n_values, len(self.classes_))
+        if counts is None:
+            counts = np.zeros(len(self.classes_), dtype=np.int64)
+        if not counts.any():
+            counts = np.zeros(len(self.classes_), dtype=np.int64)
+            label = self.classes_[int(np.argmax(self._class_totals))]     # Sem exemplos: classe mais comum
+        else:
+            label = self.classes_[int(np.argmax(counts))]
+        leaf = Node(value=label, counts=counts)
+        self._leaves[leaf] = LeafStatistics(np.zeros(shape, dtype=np.int64), depth)
+        return leaf
+
+    def route_to_leaves(self, node, rows, X, depth=0):
+        '''Encaminha as linhas até às folhas; devolve [(folha, linhas)].
+        Um valor nunca visto num nó interno cria um novo ramo com uma folha vazia'''
+        if not len(rows):
+            return []
+        if node.is_leaf_node():
+            return [(node, rows)]
+        val = X[rows, node.feature]
+        routed = np.zeros(len(rows), dtype=bool)
+        groups = []
+        for key, child in list(node.branches.items()):
+            goes = val == key
+            routed |= goes
+            groups += self.route_to_leaves(child, rows[goes], X, depth + 1)
+        for value in np.unique(val[~routed]):
+            node.branches[value] = self.new_leaf(depth + 1, node.counts.copy())
+            groups += self.route_to_leaves(node.branches[value], rows[val == value], X, depth + 1)
+        return groups
+
+    def hoeffding_bound(self, n):
+        '''Limite de Hoeffding para a diferença de ganhos com n exemplos (o ganho está em [0, log2(nº de classes)])'''
+        value_range = math.log2(max(len(self.classes_), 2))
+        return math.sqrt(value_range * value_range * math.log(1 / self.delta) / (2 * n))
+
+    def attempt_split(self, leaf, stats):
+        '''Divide a folha pelo melhor atributo se o limite de Hoeffding o permitir'''
+        class_counts = stats.table[0].sum(axis=0)
+        n = int(class_counts.sum())
+        if stats.depth >= self.max_depth or np.count_nonzero(class_counts) <= 1:
+            return
+        gains = self.gains_from_tables(stats.table, n, self.entropy_from_counts(class_counts))
+        order = np.argsort(-gains, kind='stable')
+        best = gains[order[0]]
+        second = gains[order[1]] if len(order) > 1 else 0.0
+        bound = self.hoeffding_bound(n)
+        if best <= 0 or (best - second <= bound and bound >= self.tau):
+            return
+
+        feat = int(order[0])
+        del self._leaves[leaf]
+        leaf.feature, leaf.threshold, leaf.value = feat, None, None
+        leaf.label = self.classes_[int(np.argmax(leaf.counts))]
+        branch_counts = stats.table[feat]
+        for code in np.flatnonzero(branch_counts.sum(axis=1)):
+            leaf.branches[self._feature_values[feat][code]] = self.new_leaf(stats.depth + 1, branch_counts[code].copy())
+
+    def save_state(self, filename, verbose=True):
+        '''Guarda o estado completo da árvore incremental (para continuar o treino noutra execução).
+        O estado é escrito num ficheiro temporário que depois substitui o anterior: uma interrupção
+        a meio da escrita deixa o estado anterior intacto'''
+        temp_path = f"{filename}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(self, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filename)
+        if verbose:
+            print(f"Estado da árvore incremental guardado em '{filename}'.")
+
+    @staticmethod
+    def load_state(filename):
+        '''Carrega o estado guardado com save_state.
+        Lança FileNotFoundError se o ficheiro não existe e ValueError se não contém um estado válido (ex.: escrita interrompida)'''
+        with open(filename, 'rb') as f:
+            try:
+                tree = pickle.load(f)
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, TypeError) as error:
+                raise ValueError(f"'{filename}' não contém um estado válido: {error!r}") from error
+        if not isinstance(tree, HoeffdingTree):
+            raise ValueError(f"'{filename}' não contém uma árvore incremental")
+        print(f"Estado da árvore incremental carregado de '{filename}'.")
+        return tree
@@ -13,30 +13,17 @@ def load_iris_dataset(filepath):
 
 # Função de Grid Search para escolher melhores parâmetros
 def grid_search_decision_tree(X, y):
-    best_params = None
-    best_accuracy = 0
-    best_dt = None
-
     # Separa treino/validação para avaliação dos hiperparâmetros
     X_train_split, X_val_split, y_train_split, y_val_split = train_test_split(
         X, y, test_size=0.25, random_state=42, stratify=y
     )
 
-    for max_depth in [2, 3, 4, 5]:
-        for min_samples_split in [2, 5, 10]:
-            #print(f"A testar max_depth={max_depth}, min_samples_split={min_samples_split}")
-            dt = DecisionTree(max_depth=max_depth, min_samples_split=min_samples_split, random_state=42)
-            dt.fit(X_train_split, y_train_split)
-            y_pred_val = dt.predict(X_val_split)
-            acc = (y_pred_val == y_val_split).mean()
-            #print(f"Accuracy treino: {acc:.4f}")
-
-            if acc > best_accuracy or (acc == best_accuracy and (best_params is None or max_depth < best_params[0])):
-                best_accuracy = acc
-                best_params = (max_depth, min_samples_split)
-                best_dt = dt
-
-    print(f"\nMelhor combinação encontrada: max_depth={best_params[0]}, min_samples_split={best_params[1]} com accuracy {best_accuracy:.4f}")
+    # Uma única árvore (a mais funda) é treinada; as outras combinações são obtidas cortando-a
+    param_grid = {'max_depth': [2, 3, 4, 5], 'min_samples_split': [2, 5, 10], 'random_state': [42]}
+    best_dt, best_params, _ = DecisionTree.grid_search(X_train_split, y_train_split, X_val_split, y_val_split, param_grid)
+    best_accuracy = (best_dt.predict(X_val_split) == y_val_split).mean()
+
+    print(f"\nMelhor combinação encontrada: max_depth={best_params['max_depth']}, min_samples_split={best_params['min_samples_split']} com accuracy {best_accuracy:.4f}")
     return best_dt
 
 # Função principal
@@ -0,0 +1,88 @@
+# mc_benchmark_gc.py
+
+# Mede o tempo de procura do MCTS e as pausas do garbage collector,
+# com o collector ligado e com o collector pausado durante o best_action.
+# Para comparar com a árvore antiga, o modo "pais fortes" usa nós com uma ligação forte ao pai
+# (a árvore volta a ter ciclos de referências). É uma aproximação: o backup continua iterativo,
+# por isso os números não são exatamente os da versão anterior do montecarlo.py.
+# As procuras usam uma semente (rng de best_action), por isso cada modo repete o mesmo trabalho.
+
+import gc
+import time
+from board import Board
+from montecarlo import MonteCarloNode
+
+
+class StrongParentNode(MonteCarloNode):
+    '''Nó com uma ligação forte ao pai, como na árvore antiga: pai e filhos formam ciclos que só o collector liberta'''
+    __slots__ = ['_strong_parent']
+
+    def __init__(self, state, player, parent=None, parent_action=None, config=None, rng=None):
+        super().__init__(state, player, parent=parent, parent_action=parent_action, config=config, rng=rng)
+        self._strong_parent = parent
+
+    @property
+    def parent(self):
+        return self._strong_parent
+
+
+class GCPauseMeter:
+    '''Regista, através de gc.callbacks, quantas recolhas o collector fez e quanto tempo demoraram'''
+    def __init__(self):
+        self.collections = 0
+        self.pause_time = 0.0
+        self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self._callback)
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.collections += 1
+            self.pause_time += time.perf_counter() - self._start
+            self._start = None
+
+
+def benchmark(simulations=5000, searches=5, pause_gc=False, seed=1, strong_parents=False):
+    '''Executa várias procuras a partir do tabuleiro vazio e devolve as métricas médias.
+    strong_parents: usa nós com ligação forte ao pai (árvore com ciclos), para comparar com a árvore antiga'''
+    node_class = StrongParentNode if strong_parents else MonteCarloNode
+    search_times = []
+    release_times = []
+    with GCPauseMeter() as meter:
+        for _ in range(searches):
+            board = Board()
+            start = time.perf_counter()
+            root = node_class(board.clone(), board.get_current_player())
+            root.best_action(simulations, pause_gc=pause_gc, rng=seed)
+            search_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            del root                   # Liberta a árvore (e força uma recolha para medir o custo total)
+            gc.collect()
+            release_times.append(time.perf_counter() - start)
+
+    return {
+        'search_time': sum(search_times) / searches,
+        'release_time': sum(release_times) / searches,
+        'collections': meter.collections,
+        'gc_pause_time': meter.pause_time,
+    }
+
+
+if __name__ == "__main__":
+    SIMULATIONS = 5000
+    SEARCHES = 5
+
+    for strong_parents, pause_gc in ((True, False), (False, False), (False, True)):
+        stats = benchmark(SIMULATIONS, SEARCHES, pause_gc=pause_gc, strong_parents=strong_parents)
+        mode = ("pais fortes, " if strong_parents else "") + ("GC pausado" if pause_gc else "GC ligado")
+        print(f"{mode}: procura média {stats['search_time']:.4f}s | "
+              f"libertação média {stats['release_time']:.4f}s | "
+              f"{stats['collections']} recolhas, {stats['gc_pause_time']:.4f}s em pausas")
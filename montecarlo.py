@@ -1,37 +1,255 @@
 #montecarlo.py
 
+import gc
+import math
 import time
+import weakref
 import numpy as np
 from collections import defaultdict
+from contextlib import contextmanager
 from board import Board
 import random
 from variables import *
 
 
+@contextmanager
+def gc_paused(enabled=True):
+    '''Desliga o garbage collector durante o bloco; a árvore não tem ciclos, por isso é libertada por contagem de referências'''
+    was_enabled = gc.isenabled()
+    if enabled:
+        gc.disable()
+    try:
+        yield
+    finally:
+        if enabled and was_enabled:
+            gc.enable()
+
+
+class RandomStream:
+    '''Fonte de números aleatórios com semente, usada por uma procura (ou por um jogador).
+    Os números são gerados pelo NumPy em blocos; o rollout lê-os diretamente do bloco,
+    sem fazer uma chamada ao módulo random por cada jogada simulada'''
+
+    __slots__ = ['generator', 'block_size', 'block', 'pos']
+
+    def __init__(self, seed=None, block_size=4096):
+        self.generator = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.refill()
+
+    def refill(self):
+        '''Gera um novo bloco de números uniformes em [0, 1)'''
+        self.block = self.generator.random(self.block_size).tolist()
+        self.pos = 0
+
+    def random(self):
+        '''Próximo número uniforme em [0, 1)'''
+        if self.pos >= self.block_size:
+            self.refill()
+        value = self.block[self.pos]
+        self.pos += 1
+        return value
+
+    def choice(self, seq):
+        '''Escolhe um elemento de seq'''
+        return seq[int(self.random() * len(seq))]
+
+    def sample(self, seq, k):
+        '''Escolhe k elementos distintos de seq (Fisher-Yates parcial)'''
+        pool = list(seq)
+        n = len(pool)
+        for i in range(k):
+            j = i + int(self.random() * (n - i))
+            pool[i], pool[j] = pool[j], pool[i]
+        return pool[:k]
+
+
+def make_stream(rng=None):
+    '''Aceita um RandomStream, uma semente (int) ou None e devolve um RandomStream'''
+    return rng if isinstance(rng, RandomStream) else RandomStream(rng)
+
+
+def random_rollout(node, rng):
+    '''Política de rollout por omissão: jogadas aleatórias até ao fim do jogo.
+    Devolve o resultado (0 empate, 1 ou 2 o vencedor)'''
+    current_rollout_state = node.state.clone()   # Cópia do estado atual do jogo, não modificando o original
+    current_rollout_state.player = node.player   # drop_piece alterna o jogador a cada jogada
+    top_row = current_rollout_state.board[0]     # Uma coluna é válida enquanto a célula do topo estiver vazia
+    block, pos, block_size = rng.block, rng.pos, rng.block_size
+
+    while not current_rollout_state.game_over:
+        valid_moves = [col for col in range(COLS) if top_row[col] == EMPTY]    # Verifica as jogadas válidas no estado simulado
+        if not valid_moves:
+            break
+
+        if pos >= block_size:     # Bloco de números aleatórios esgotado
+            rng.refill()
+            block, pos = rng.block, 0
+        action = valid_moves[int(block[pos] * len(valid_moves))]   # Escolha aleatória de uma jogada válida
+        pos += 1
+
+        current_rollout_state.drop_piece(action)       # Aplica a jogada ao estado simulado
+
+    rng.pos = pos
+    return node.game_result(current_rollout_state)
+
+
+def standard_backup(node, result):
+    '''Regra de backup por omissão: soma uma visita e o resultado a todos os nós até à raiz'''
+    while node is not None:
+        node.visits += 1              # Cada vez que o nó é alcançado numa simulação
+        node.results[result] += 1     # Atualiza o nr de vitórias, de derrotas e de empates para o nó atual
+        node = node.parent            # Sobe para o nó pai (iterativo, sem recursão)
+
+
+def centre_prior(state, player, actions):
+    '''Prior barato: colunas centrais primeiro'''
+    centre = COLS // 2
+    return sorted(actions, key=lambda col: abs(col - centre))
+
+
+def is_winning_move(state, col, piece):
+    '''Verifica se jogar piece na coluna col faz 4 em linha, olhando só para as linhas que passam pela nova peça'''
+    row = state.get_next_open_row(col)
+    if row < 0:
+        return False
+    board = state.board
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        count = 1
+        for sign in (1, -1):
+            r, c = row + sign * dr, col + sign * dc
+            while 0 <= r < ROWS and 0 <= c < COLS and board[r][c] == piece:
+                count += 1
+                r += sign * dr
+                c += sign * dc
+        if count >= 4:
+            return True
+    return False
+
+
+def tactical_prior(state, player, actions):
+    '''Prior tático: jogadas que ganham, depois jogadas que bloqueiam a vitória do adversário, depois o centro'''
+    opponent = PLAYER2 if player == PLAYER1 else PLAYER1
+
+    def rank(col):
+        if is_winning_move(state, col, player):
+            return 0
+        if is_winning_move(state, col, opponent):
+            return 1
+        return 2
+
+    return sorted(centre_prior(state, player, actions), key=rank)
+
+
+def decision_tree_prior(tree):
+    '''Cria um prior a partir de uma árvore de decisão treinada: a coluna prevista primeiro, depois o centro'''
+    def prior(state, player, actions):
+        flat_state = [cell for row in state.board for cell in row]
+        predicted = tree.predict([flat_state])[0]
+        return sorted(centre_prior(state, player, actions), key=lambda col: col != predicted)
+    return prior
+
+
+PRIORS = {'centre': centre_prior, 'tactical': tactical_prior}
+
+FINAL_MOVE_RULES = ('visits', 'winrate')
+
+
+class MCTSConfig:
+    '''Políticas da procura MCTS, partilhadas por todos os nós de uma árvore:
+        c_param        - constante de exploração do UCB1
+        max_children   - nº máximo de filhos explorados por nó, escolhidos aleatoriamente (None = todos);
+                         com widening, são os primeiros max_children segundo o prior
+        widening       - (C, alpha): alargamento progressivo, um nó com n visitas pode ter ceil(C * n^alpha) filhos
+                         (None = expande todos os filhos antes de usar o UCB1)
+        prior          - função (estado, jogador, jogadas) -> jogadas ordenadas da melhor para a pior,
+                         ou o nome de um prior em PRIORS; define a ordem em que os filhos são desbloqueados
+        final_move     - 'visits' (filho mais visitado) ou 'winrate' (filho com maior taxa de vitórias)
+        rollout_policy - função (nó, rng) -> resultado da simulação
+        backup         - função (nó, resultado) que propaga o resultado até à raiz
+        max_nodes      - limite de nós da árvore (None = sem limite)
+        pause_gc       - desliga o garbage collector durante a procura'''
+
+    __slots__ = ['c_param', 'max_children', 'widening', 'prior', 'final_move', 'rollout_policy', 'backup', 'max_nodes', 'pause_gc']
+
+    def __init__(self, c_param=np.sqrt(2), max_children=None, widening=None, prior=None, final_move='visits',
+                 rollout_policy=random_rollout, backup=standard_backup, max_nodes=None, pause_gc=False):
+        if final_move not in FINAL_MOVE_RULES:
+            raise ValueError(f"Regra de escolha da jogada inválida: {final_move} (use {FINAL_MOVE_RULES})")
+        if max_children is not None and max_children < 1:
+            raise ValueError(f"max_children inválido: {max_children}")
+        if widening is not None and (len(widening) != 2 or widening[0] <= 0 or not 0 < widening[1] <= 1):
+            raise ValueError(f"widening inválido: {widening} (use (C, alpha) com C > 0 e 0 < alpha <= 1)")
+        if isinstance(prior, str):
+            if prior not in PRIORS:
+                raise ValueError(f"Prior inválido: {prior} (use {list(PRIORS)})")
+            prior = PRIORS[prior]
+        if widening is not None and prior is None:
+            prior = centre_prior
+        self.c_param = c_param
+        self.max_children = max_children
+        self.widening = widening
+        self.prior = prior
+        self.final_move = final_move
+        self.rollout_policy = rollout_policy
+        self.backup = backup
+        self.max_nodes = check_max_nodes(max_nodes)
+        self.pause_gc = pause_gc
+
+
+def check_max_nodes(max_nodes):
+    '''Valida o limite de nós: tem de caber a raiz e todos os seus filhos, senão a poda nunca liberta espaço'''
+    if max_nodes is not None and max_nodes <= 2 * (COLS + 1):
+        raise ValueError(f"max_nodes inválido: {max_nodes} (tem de ser maior que {2 * (COLS + 1)})")
+    return max_nodes
+
+
+DEFAULT_CONFIG = MCTSConfig()
+
+
 class MonteCarloNode:
     
-    __slots__ = ['state', 'player', 'parent', 'parent_action', 'children', 'visits', 'results', 'untried_actions']
+    __slots__ = ['state', 'player', '_parent', 'parent_action', 'children', 'visits', 'results', 'untried_actions', 'config', '__weakref__']
     
-    def __init__(self, state, player, parent=None, parent_action=None):
+    def __init__(self, state, player, parent=None, parent_action=None, config=None, rng=None):
         self.state = state                 
         self.player = player               
-        self.parent = parent
+        self._parent = weakref.ref(parent) if parent is not None else None   # Ligação fraca ao pai: a árvore não tem ciclos de referências
         self.parent_action = parent_action        # ação que levou ao estado atual
         self.children = []
         self.visits = 0
         self.results = [0, 0, 0]  # ao aceder a uma chave que não existe, inicia-a com 0
-        self.untried_actions = self.get_legal_actions()
+        self.config = config if config is not None else DEFAULT_CONFIG   # Políticas da procura (partilhadas pela árvore)
+        self.untried_actions = self.initial_actions(rng)
 
     def get_legal_actions(self): 
         '''Retorna todas as jogadas válidas no estado atual'''
         return [col for col in range(COLS) if self.state.is_valid_move(col)]
 
-    def expand(self): 
+    def initial_actions(self, rng=None):
+        '''Jogadas que o nó pode expandir: todas as válidas ou, com max_children, um subconjunto aleatório.
+        Com prior, ficam ordenadas para que expand (pop do fim da lista) tire primeiro a melhor'''
+        legal_actions = self.get_legal_actions()
+        max_children = self.config.max_children
+        prior = self.config.prior
+        if prior is not None and legal_actions:
+            ordered = prior(self.state, self.player, legal_actions)
+            if max_children is not None:
+                ordered = ordered[:max_children]
+            return ordered[::-1]
+        if max_children is not None and len(legal_actions) > max_children:
+            if rng is None:
+                rng = RandomStream()
+            return rng.sample(legal_actions, max_children)
+        return legal_actions
+
+    def expand(self, rng=None): 
         '''Expande o nó atual, adicionando um filho'''
         action = self.untried_actions.pop()   # Remove a jogada ainda não expandida da lista das jogadas possíveis
         next_state = self.move(action)        # Aplica a jogada ao estado atual
         next_player = PLAYER2 if self.player == PLAYER1 else PLAYER1
-        child_node = MonteCarloNode(next_state, next_player, parent=self, parent_action=action)   # Cria o nó filho
+        child_node = type(self)(next_state, next_player, parent=self, parent_action=action,
+                                config=self.config, rng=rng)   # Cria o nó filho (do mesmo tipo) com as mesmas políticas
         self.children.append(child_node)      # Adiciona o nó filho à lista de filhos do nó atual
         return child_node
 
@@ -39,40 +257,39 @@ class MonteCarloNode:
         '''Verifica se o jogo acabou no estado atual'''
         return self.state.is_game_over()
 
-    def rollout(self): 
-        '''Simula um jogo aleatório a partir do estado atual até um estado terminal'''
-        current_rollout_state = self.state.clone()   # Cópia do estado atual do jogo, não modificando o original
-        current_player = self.player
-
-        while not current_rollout_state.is_game_over():
-            valid_moves = [col for col in range(COLS) if current_rollout_state.is_valid_move(col)]    # Verifica as jogadas válidas no estado simulado
-            if not valid_moves:
-                break
-
-            action = random.choice(valid_moves)   # Escolha aleatória de uma jogada válida
+    def rollout(self, rng=None): 
+        '''Simula um jogo a partir do estado atual até um estado terminal, com a política de rollout configurada'''
+        if rng is None:
+            rng = RandomStream()
+        return self.config.rollout_policy(self, rng)
 
-            current_rollout_state.player = current_player  # Atualiza o jogador no estado simulado
-            current_rollout_state.drop_piece(action)       # Aplica a jogada ao estado simulado
-
-            current_player = PLAYER1 if current_player == PLAYER2 else PLAYER2   # Alterna o jogador
-
-        return self.game_result(current_rollout_state)   
+    @property
+    def parent(self):
+        '''Nó pai (None na raiz ou se a árvore acima deste nó já foi libertada)'''
+        return self._parent() if self._parent is not None else None
 
     def backpropagate(self, result): 
-        '''Propaga os resultados para cima na árvore'''
-        self.visits += 1              # Cada vez que o nó é alcançado numa simulação
-        self.results[result] += 1     # Atualiza o nr de vitórias, de derrotas e de empates para o nó atual
-        if self.parent:
-            self.parent.backpropagate(result)    # Propaga o resultado para o nó pai
+        '''Propaga os resultados para cima na árvore, com a regra de backup configurada'''
+        self.config.backup(self, result)
 
     def is_fully_expanded(self): 
-        '''Verifica se todos os movimentos possíveis foram explorados'''
-        return len(self.untried_actions) == 0
+        '''Verifica se todos os movimentos possíveis foram explorados.
+        Com alargamento progressivo, o nó só desbloqueia mais um filho quando as visitas o permitem'''
+        if not self.untried_actions:
+            return True
+        widening = self.config.widening
+        if widening is None:
+            return False
+        pw_c, pw_alpha = widening
+        allowed_children = max(1, math.ceil(pw_c * self.visits ** pw_alpha))
+        return len(self.children) >= allowed_children
 
-    def best_child(self, c_param=np.sqrt(2)): 
+    def best_child(self, c_param=None): 
         '''Seleciona o melhor filho usando a fórmula UCB1 = exploitation + exploration'''
         if not self.children:    # Nenhuma jogada foi expandida
             return None
+        if c_param is None:
+            c_param = self.config.c_param
             
         # Cálculo do UCB para cada filho
         ucb_values = []
@@ -87,12 +304,12 @@ class MonteCarloNode:
         
         return self.children[np.argmax(ucb_values)]   # Expande o filho com o maior valor UCB
 
-    def _tree_policy(self):  
+    def _tree_policy(self, rng=None):  
         ''' Percorre a árvore e vai retornando os melhores filhos até chegar a um nó terminal ou um nó não expandido'''
         current_node = self
         while not current_node.is_terminal_node():    
             if not current_node.is_fully_expanded():    # Se ainda houver jogadas não exploradas
-                return current_node.expand()            # Expande o nó atual
+                return current_node.expand(rng)         # Expande o nó atual
             else:
                 next_node = current_node.best_child()   # Já está totalmente expandido, então escolhe o melhor filho
                 if next_node is None:                   
@@ -100,35 +317,98 @@ class MonteCarloNode:
                 current_node = next_node                # Avança na árvore para o nó filho escolhido
         return current_node
 
-    def best_action(self, simulations=1000): 
-        '''Executa várias simulações e escolhe a jogada que foi mais visitada'''
+    def tree_size(self):
+        '''Conta os nós da subárvore que começa neste nó (inclui o próprio nó)'''
+        count = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
+    def collapse(self, rng=None):
+        '''Liberta os filhos deste nó, mantendo as suas estatísticas; o nó volta a poder ser expandido'''
+        self.children = []
+        self.untried_actions = self.initial_actions(rng)
+
+    def prune_least_visited(self, target_size, rng=None):
+        '''Liberta as subárvores menos visitadas até a árvore ter no máximo target_size nós.
+        Devolve o número de nós que ficaram na árvore'''
+        # Recolhe os nós internos (com filhos), exceto a raiz, e a sua profundidade
+        candidates = []
+        stack = [(self, 0)]
+        size = 0
+        while stack:
+            node, depth = stack.pop()
+            size += 1
+            if node is not self and node.children:
+                candidates.append((node.visits, -depth, node))
+            for child in node.children:
+                stack.append((child, depth + 1))
+
+        # Os menos visitados primeiro; em caso de empate, os mais profundos (descendentes antes dos antepassados)
+        candidates.sort(key=lambda entry: (entry[0], entry[1]))
+        for _, _, node in candidates:
+            if size <= target_size:
+                break
+            size -= node.tree_size() - 1        # Nós que saem da árvore (a subárvore atual, sem o próprio nó)
+            node.collapse(rng)
+        return size
+
+    def _search(self, simulations, max_nodes=None, pause_gc=None, rng=None):
+        '''Executa as simulações do MCTS, mantendo a árvore abaixo de max_nodes nós (se definido).
+        max_nodes e pause_gc a None usam os valores da configuração'''
+        if max_nodes is None:
+            max_nodes = self.config.max_nodes
+        if pause_gc is None:
+            pause_gc = self.config.pause_gc
+        with gc_paused(pause_gc):
+            self._run_simulations(simulations, check_max_nodes(max_nodes), rng)
+
+    def _run_simulations(self, simulations, max_nodes, rng):
+        node_count = self.tree_size() if max_nodes is not None else 0
+        prune_target = max_nodes * 3 // 4 if max_nodes is not None else 0   # Poda com folga para não podar em todas as iterações
+
         for _ in range(simulations):
-            v = self._tree_policy()   # Seleciona um nó promissor
-            reward = v.rollout()      # Faz uma simulação a partir desse nó
+            v = self._tree_policy(rng)   # Seleciona um nó promissor
+            if max_nodes is not None and v is not self and v.visits == 0:
+                node_count += 1       # O nó foi acabado de criar pela expansão
+            reward = v.rollout(rng)   # Faz uma simulação a partir desse nó
             v.backpropagate(reward)   # Propaga o resultado da simulação até à raiz
 
-        # Retorna o filho com mais visitas
-        if not self.children:
-            return random.choice(self.get_legal_actions())  # Se não tiver filhos, retorna uma jogada aleatória válida
-        
-        visits = [child.visits for child in self.children]  # Escolhe o filho com mais visitas
-        return self.children[np.argmax(visits)].parent_action, self.children[np.argmax(visits)].results[self.player] / self.children[np.argmax(visits)].visits if self.children[np.argmax(visits)].visits > 0 else 0      # Devolve a ação que levou a esse filho
-    
-    def best_action_by_winrate(self, simulations=1000):    # PARA TESTAR
-        '''Executa várias simulações e escolhe a jogada com a maior taxa de vitórias'''
-        for _ in range(simulations):
-            v = self._tree_policy()
-            reward = v.rollout()
-            v.backpropagate(reward)
+            if max_nodes is not None and node_count >= max_nodes:
+                node_count = self.prune_least_visited(prune_target, rng)
 
+    def final_action(self, rule=None, rng=None):
+        '''Escolhe a jogada final segundo a regra ('visits' ou 'winrate'); devolve (ação, taxa de vitórias)'''
+        if rule is None:
+            rule = self.config.final_move
         if not self.children:
-            return random.choice(self.get_legal_actions())
+            return make_stream(rng).choice(self.get_legal_actions()), 0.0  # Se não tiver filhos, retorna uma jogada aleatória válida
 
         win_rates = [
             child.results[self.player] / child.visits if child.visits > 0 else 0
             for child in self.children
         ]
-        return self.children[np.argmax(win_rates)].parent_action, np.argmax(win_rates)
+        if rule == 'winrate':
+            best = int(np.argmax(win_rates))                                  # Filho com maior taxa de vitórias
+        else:
+            best = int(np.argmax([child.visits for child in self.children]))  # Filho com mais visitas
+        return self.children[best].parent_action, win_rates[best]             # Devolve a ação que levou a esse filho
+
+    def best_action(self, simulations=1000, max_nodes=None, pause_gc=None, rng=None): 
+        '''Executa várias simulações e escolhe a jogada segundo a regra configurada (por omissão, a mais visitada).
+        rng pode ser um RandomStream ou uma semente: a mesma semente reproduz a mesma árvore'''
+        rng = make_stream(rng)
+        self._search(simulations, max_nodes, pause_gc, rng)
+        return self.final_action(rng=rng)
+    
+    def best_action_by_winrate(self, simulations=1000, max_nodes=None, pause_gc=None, rng=None):    # PARA TESTAR
+        '''Executa várias simulações e escolhe a jogada com a maior taxa de vitórias'''
+        rng = make_stream(rng)
+        self._search(simulations, max_nodes, pause_gc, rng)
+        return self.final_action('winrate', rng)
 
     def move(self, action):  
         '''Aplica uma ação ao estado atual e retorna o novo estado'''
@@ -148,19 +428,27 @@ class MonteCarloNode:
         
 
 class MonteCarlo_Player: 
-    def __init__(self, difficulty='medium', c_param=np.sqrt(2)):
+    SIMULATIONS = {'easy': 500, 'medium': 2000, 'hard': 10000}   # Nº de simulações por dificuldade
+    LABEL = ""
+
+    def __init__(self, difficulty='medium', c_param=np.sqrt(2), max_nodes=None, pause_gc=True, seed=None,
+                 max_children=None, widening=None, prior=None, final_move='visits',
+                 rollout_policy=random_rollout, backup=standard_backup):
         self.difficulty = difficulty
-        if difficulty == 'easy':
-            self.simulations = 500   
-        elif difficulty == 'medium':
-            self.simulations = 2000  
-        elif difficulty == 'hard':
-            self.simulations = 10000
+        if difficulty not in self.SIMULATIONS:
+            raise ValueError(f"Dificuldade inválida: {difficulty} (use {list(self.SIMULATIONS)})")
+        self.simulations = self.SIMULATIONS[difficulty]
         self.c_param = c_param
+        self.max_nodes = max_nodes                    # Limite de nós da árvore (None = sem limite)
+        self.pause_gc = pause_gc                      # Desliga o garbage collector durante a procura
+        self.config = MCTSConfig(c_param=c_param, max_children=max_children, widening=widening, prior=prior,
+                                 final_move=final_move, rollout_policy=rollout_policy, backup=backup,
+                                 max_nodes=max_nodes, pause_gc=pause_gc)
+        self.rng = RandomStream(seed)                 # Com semente, a sequência de jogadas é reprodutível
 
     def make_move(self, board): 
         '''Representa um jogador que usa MCTS para fazer a sua jogada'''
-        root = MonteCarloNode(board.clone(), board.get_current_player())    # Cria o nó raiz da árvore
+        root = MonteCarloNode(board.clone(), board.get_current_player(), config=self.config, rng=self.rng)    # Cria o nó raiz da árvore
         legal_actions = root.get_legal_actions()
         if not legal_actions:
             return -1            # Sem jogadas possíveis
@@ -168,32 +456,15 @@ class MonteCarlo_Player:
             return legal_actions[0]    # Se houver apenas uma jogada possível, retorna essa jogada
         
         start_time = time.time()
-        action, win_rate = root.best_action(self.simulations)     # Executa o MCTS para encontrar a melhor jogada
+        action, win_rate = root.best_action(self.simulations, rng=self.rng)     # Executa o MCTS para encontrar a melhor jogada
         end_time = time.time()
-        print(f"[{self.difficulty}] Jogada escolhida: {action} em {end_time - start_time:.4f} segundos")
+        print(f"[{self.difficulty}{self.LABEL}] Jogada escolhida: {action} em {end_time - start_time:.4f} segundos")
         return action
 
 
-class MonteCarlo_Player_WinRate:    # PARA TESTAR
-    def __init__(self, difficulty='medium', c_param=np.sqrt(2)):
-        self.difficulty = difficulty
-        if difficulty == 'easy':
-            self.simulations = 500
-        elif difficulty == 'medium':
-            self.simulations = 2000
-        elif difficulty == 'hard':
-            self.simulations = 10000
+class MonteCarlo_Player_WinRate(MonteCarlo_Player):    # PARA TESTAR
+    '''Jogador MCTS que escolhe a jogada final pela taxa de vitórias'''
+    LABEL = " - WINRATE"
 
-    def make_move(self, board): 
-        root = MonteCarloNode(board.clone(), board.get_current_player())
-        legal_actions = root.get_legal_actions()
-        if not legal_actions:
-            return -1, 0.0
-        if len(legal_actions) == 1:
-            return legal_actions[0], 0.0
-        
-        start_time = time.time()
-        action, win_rate = root.best_action_by_winrate(self.simulations)
-        end_time = time.time()
-        print(f"[{self.difficulty} - WINRATE] Jogada escolhida: {action} em {end_time - start_time:.4f} segundos")
-        return action
\ No newline at end of file
+    def __init__(self, difficulty='medium', c_param=np.sqrt(2), max_nodes=None, pause_gc=True, seed=None, **policies):
+        super().__init__(difficulty, c_param, max_nodes, pause_gc, seed, final_move='winrate', **policies)
\ No newline at end of file
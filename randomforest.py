@@ -0,0 +1,150 @@
+# randomforest.py
+
+# Floresta aleatória construída sobre a DecisionTree:
+# - cada árvore é treinada com uma amostra bootstrap do conjunto de treino
+# - em cada nó só é avaliado um subconjunto aleatório dos atributos (max_features)
+# - as árvores são treinadas em paralelo, em processos diferentes
+# - a previsão é o voto maioritário das árvores, calculado com a forma compilada de cada árvore
+
+import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from decisiontree import DecisionTree
+from boardfeatures import legal_move_mask
+
+
+_forest_X = None
+_forest_y = None
+
+
+def _set_training_data(X, y):
+    '''Inicializador dos processos do pool: os dados de treino são enviados uma única vez a cada processo'''
+    global _forest_X, _forest_y
+    _forest_X, _forest_y = X, y
+
+
+def _fit_tree(seed, params, bootstrap):
+    '''Tarefa do pool: treina uma árvore com uma amostra bootstrap dos dados de treino'''
+    rng = np.random.default_rng(seed)
+    if bootstrap:
+        rows = rng.integers(len(_forest_y), size=len(_forest_y))
+        X, y = _forest_X[rows], _forest_y[rows]
+    else:
+        X, y = _forest_X, _forest_y
+    tree = DecisionTree(random_state=int(rng.integers(2**32)), **params)
+    tree.fit(X, y)
+    tree.root = None      # Só a forma compilada é usada (e enviada de volta ao processo principal)
+    return tree
+
+
+class RandomForest:
+    MODEL_EXTENSION = ".forest"
+
+    def __init__(self, n_estimators=10, max_depth=12, min_samples_split=2, max_features=0.5,
+                 bootstrap=True, random_state=None, n_jobs=1):
+        '''Parâmetros da floresta aleatória'''
+        if n_estimators < 1:
+            raise ValueError("n_estimators deve ser pelo menos 1")
+        self.n_estimators = n_estimators              # Nº de árvores
+        self.max_depth = max_depth                    # Profundidade máxima de cada árvore
+        self.min_samples_split = min_samples_split    # Nº mínimo de amostras para dividir um nó
+        self.max_features = max_features              # Atributos sorteados em cada nó (ver DecisionTree.resolve_max_features);
+                                                      # com 'sqrt' cada árvore fica demasiado fraca nos 42 atributos do tabuleiro
+        self.bootstrap = bootstrap                    # Treina cada árvore com uma amostra bootstrap
+        self.random_state = random_state              # Para garantir aleatoriedade reprodutível
+        self.n_jobs = n_jobs                          # Nº de processos no treino (-1 = todos os CPUs)
+        self.trees = []
+        self.classes_ = None
+
+    def tree_params(self):
+        '''Parâmetros passados a cada árvore'''
+        return {'max_depth': self.max_depth, 'min_samples_split': self.min_samples_split,
+                'max_features': self.max_features}
+
+    def fit(self, X, y):
+        '''Treina as árvores da floresta, em paralelo se n_jobs > 1'''
+        X = np.array(X)
+        y = np.array(y)
+        self.classes_ = np.unique(y)
+        seeds = np.random.SeedSequence(self.random_state).generate_state(self.n_estimators)   # Uma semente por árvore
+        params = self.tree_params()
+
+        n_jobs = DecisionTree(n_jobs=self.n_jobs).effective_n_jobs()
+        if n_jobs > 1:
+            with ProcessPoolExecutor(min(n_jobs, self.n_estimators), initializer=_set_training_data,
+                                     initargs=(X, y)) as pool:
+                self.trees = list(pool.map(_fit_tree, seeds, [params] * self.n_estimators,
+                                           [self.bootstrap] * self.n_estimators))
+        else:
+            _set_training_data(X, y)
+            try:
+                self.trees = [_fit_tree(seed, params, self.bootstrap) for seed in seeds]
+            finally:
+                _set_training_data(None, None)
+        return self
+
+    def votes(self, X):
+        '''Nº de votos de cada classe (colunas, pela ordem de classes_) para cada exemplo'''
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        votes = np.zeros((len(X), len(self.classes_)), dtype=np.int32)
+        rows = np.arange(len(X))
+        for tree in self.trees:
+            compiled = tree.compiled
+            # Classes de cada árvore (incluindo a classe por omissão) convertidas para as colunas de votes
+            tree_classes = np.searchsorted(self.classes_, compiled.labels)
+            votes[rows, tree_classes[compiled.predict_codes(X)]] += 1
+        return votes
+
+    def predict_proba(self, X):
+        '''Fração de árvores que vota em cada classe'''
+        return self.votes(X) / len(self.trees)
+
+    def predict(self, X, legal_moves=False):
+        '''Classe mais votada para cada exemplo (em caso de empate, a primeira de classes_).
+        Com legal_moves=True, X são tabuleiros e só contam os votos nas colunas legais'''
+        if hasattr(X, 'values'):    # DataFrame
+            X = X.values
+        votes = self.votes(X)
+        if legal_moves:
+            votes[~legal_move_mask(X, self.classes_)] = -1
+        return self.classes_[np.argmax(votes, axis=1)]
+
+    def save(self, path):
+        '''Guarda a floresta numa pasta: forest.json com os parâmetros e um ficheiro .dtm por árvore'''
+        if not self.trees:
+            raise ValueError("A floresta tem de ser treinada antes de ser guardada")
+        os.makedirs(path, exist_ok=True)
+        files = []
+        for i, tree in enumerate(self.trees):
+            files.append(f"tree_{i:03d}{DecisionTree.MODEL_EXTENSION}")
+            tree.save(os.path.join(path, files[-1]))
+        header = {'n_estimators': self.n_estimators, 'bootstrap': self.bootstrap, 'random_state': self.random_state,
+                  'classes': self.classes_.tolist(), 'trees': files, **self.tree_params()}
+        # Cada árvore é substituída de uma vez (ver DecisionTree.save), e forest.json também
+        header_path = os.path.join(path, "forest.json")
+        temp_path = f"{header_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(header, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, header_path)
+        print(f"Floresta guardada em '{path}'.")
+
+    def load(self, path):
+        '''Carrega uma floresta guardada com save e devolve-a.
+        Lança FileNotFoundError se a pasta não existe e ValueError se o conteúdo não é válido'''
+        try:
+            with open(os.path.join(path, "forest.json")) as f:
+                header = json.load(f)
+            forest = RandomForest(n_estimators=header['n_estimators'], max_depth=header['max_depth'],
+                                  min_samples_split=header['min_samples_split'], max_features=header['max_features'],
+                                  bootstrap=header['bootstrap'], random_state=header['random_state'])
+            forest.classes_ = np.array(header['classes'])
+            forest.trees = [DecisionTree().load(os.path.join(path, name)) for name in header['trees']]
+        except (KeyError, json.JSONDecodeError) as error:
+            raise ValueError(f"'{path}' não contém uma floresta válida ({error})")
+        print(f"Floresta carregada de '{path}'.")
+        return forest